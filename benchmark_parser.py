@@ -0,0 +1,229 @@
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+
+# parser.py from next to this script, loaded by path: up to Python 3.9
+# "import parser" can get the standard library's parser module instead,
+# which Windows builds have built in
+_spec = importlib.util.spec_from_file_location(
+    "customs_parser", os.path.join(os.path.dirname(os.path.abspath(__file__)), "parser.py"))
+parser = importlib.util.module_from_spec(_spec)
+sys.modules["customs_parser"] = parser
+_spec.loader.exec_module(parser)
+
+# Building blocks for synthetic customs declaration lines
+PRODUCTS = [
+    "Кава смажена в зернах", "Фарба акрилова для внутрішніх робіт", "Насіння соняшнику гібрид",
+    "Запчастини для автомобілів", "Натрію гідроксид технічний", "Тканина бавовняна",
+    "Папір офісний А4", "Шоколад молочний", "Дріт сталевий", "Насос відцентровий",
+    "Реагент лабораторний", "Інструмент ручний", "Пластмасові вироби", "Обладнання для пакування",
+    "Spare parts for industrial equipment", "Laboratory reagent", "Stainless steel fittings"
+]
+ITEMS = [
+    "Арабіка", "Робуста", "Контейнер харчовий 1л", "Кришка 10 см", "Ключ гайковий 17мм",
+    "Двигун 5 кВт", "Фільтр масляний", "Прокладка гумова", "Підшипник кульковий", "Sealing ring",
+    "Valve body", "Гайка М8", "Болт М10х40"
+]
+BRANDS = ["Lavazza", "Dulux", "Stanley", "Grundfos", "Navigator", "Roshen", "Bosch", "Limagrain", "Textil"]
+MANUFACTURERS = [
+    "Luigi Lavazza S.p.A.", "AkzoNobel", "Stanley Black & Decker", "Grundfos A/S", "Bosch GmbH",
+    "ПАТ Рошен", "Solvay", "Plastik LLC", "Textil Group"
+]
+COUNTRIES = ["IT", "DE", "PL", "CN", "US", "DK", "TR", "FR", "UA", "Польща", "Germany", "Китай"]
+FORMULAS = ["NaOH", "NaCl", "KOH", "H2SO4", "CaCO3", "C6H12O6"]
+UNITS = ["шт", "кор", "мішків", "pcs", "boxes"]
+SPEC_FRAGMENTS = [
+    "корпус з нержавіючої сталі AISI 304", "продуктивність 12 м3/год", "напір 45 м",
+    "потужність 3 кВт", "напруга 380 В", "частота 50 Гц", "ступінь захисту IP55",
+    "клас ізоляції F", "температура рідини до 120 С", "щільність 120 г/м2", "ширина 150 см",
+    "діаметр 2 мм", "тиск 16 бар", "матеріал ущільнення EPDM"
+]
+
+
+def article(rng):
+    return f"{rng.choice('ABCDKMXZ')}{rng.choice('ABCDKMXZ')}-{rng.randint(100, 99999)}"
+
+
+def trailer(rng):
+    """
+    Brand / manufacturer / country block that closes most declarations
+    """
+    parts = []
+    if rng.random() < 0.6:
+        parts.append(rng.choice([
+            f"Торговельна марка {rng.choice(BRANDS)}",
+            f"торговельна марка: {rng.choice(BRANDS)}",
+            f"ТМ \"{rng.choice(BRANDS)}\"",
+            f"під торговою маркою '{rng.choice(BRANDS)}'",
+            f"Brand: {rng.choice(BRANDS)}"
+        ]))
+    if rng.random() < 0.7:
+        parts.append(rng.choice([
+            f"Виробник {rng.choice(MANUFACTURERS)}",
+            f"Виробник: {rng.choice(MANUFACTURERS)}",
+            f"Manufacturer {rng.choice(MANUFACTURERS)}",
+            f"Виготовлено: {rng.choice(MANUFACTURERS)}"
+        ]))
+    if rng.random() < 0.8:
+        parts.append(rng.choice([
+            f"Країна виробництва {rng.choice(COUNTRIES)}",
+            f"Країна походження {rng.choice(COUNTRIES)}",
+            f"Country of Origin {rng.choice(COUNTRIES)}",
+            f"Made in {rng.choice(COUNTRIES)}"
+        ]))
+    return " ".join(parts)
+
+
+def simple_line(rng):
+    return (f"{rng.choice(PRODUCTS)} арт. {article(rng)} кількість {rng.randint(1, 500)} шт "
+            f"вага {rng.randint(1, 900)}.{rng.randint(0, 9)} кг {trailer(rng)}")
+
+
+def multi_product_line(rng):
+    items = "; ".join(
+        f"{rng.choice(ITEMS)} - {rng.randint(1, 200)} {rng.choice(UNITS)}"
+        for _ in range(rng.randint(2, 6))
+    )
+    return f"{rng.randint(1, 40)}. {rng.choice(PRODUCTS)}: {items}. {trailer(rng)}"
+
+
+def lot_line(rng):
+    lots = ", ".join(str(rng.randint(10000, 99999)) for _ in range(rng.randint(1, 8)))
+    return (f"{rng.choice(PRODUCTS)} ({rng.randint(1, 300)} кор) врожаю {rng.randint(2018, 2024)} р., "
+            f"lot. {lots} {trailer(rng)}")
+
+
+def chemical_line(rng):
+    return (f"{rng.choice(PRODUCTS)}, Хімічна формула {rng.choice(FORMULAS)}, {rng.randint(5, 50)} кг "
+            f"{rng.randint(1, 80)} мішків, вага нетто {rng.randint(100, 5000)} кг. {trailer(rng)}")
+
+
+def article_quantity_line(rng):
+    return (f"{rng.choice(PRODUCTS)} - {rng.randint(1, 100)} шт, артикул {article(rng)}, "
+            f"в упаковці {rng.randint(2, 24)} шт, модель {article(rng)} x {rng.randint(2, 50)} {trailer(rng)}")
+
+
+def long_spec_line(rng):
+    specs = ", ".join(rng.choice(SPEC_FRAGMENTS) for _ in range(rng.randint(10, 60)))
+    return f"{rng.choice(PRODUCTS)} {specs}, {rng.randint(1, 20)} шт, код {article(rng)} {trailer(rng)}"
+
+
+# Line generators and how often each kind of line appears in the corpus
+LINE_KINDS = [
+    (simple_line, 30),
+    (multi_product_line, 20),
+    (lot_line, 10),
+    (chemical_line, 10),
+    (article_quantity_line, 20),
+    (long_spec_line, 10)
+]
+
+
+def generate_corpus(size, seed=0):
+    """
+    Generate a reproducible list of synthetic customs declaration lines
+    """
+    rng = random.Random(seed)
+    generators = [generator for generator, _ in LINE_KINDS]
+    weights = [weight for _, weight in LINE_KINDS]
+    return [rng.choices(generators, weights)[0](rng).strip() for _ in range(size)]
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def time_calls(func, args_list):
+    """
+    Call func once per argument tuple and summarize the per-call latencies.
+    Calls that raise are timed too and counted as errors.
+    """
+    latencies = []
+    errors = 0
+    for args in args_list:
+        start = time.perf_counter()
+        try:
+            func(*args)
+        except Exception:
+            errors += 1
+        latencies.append(time.perf_counter() - start)
+
+    latencies.sort()
+    total = sum(latencies)
+    return {
+        "calls": len(latencies),
+        "errors": errors,
+        "total_seconds": round(total, 6),
+        "rows_per_second": round(len(latencies) / total, 1) if total else None,
+        "mean_us": round(1e6 * statistics.fmean(latencies), 3) if latencies else None,
+        "p50_us": round(1e6 * percentile(latencies, 0.50), 3) if latencies else None,
+        "p99_us": round(1e6 * percentile(latencies, 0.99), 3) if latencies else None,
+        "max_us": round(1e6 * latencies[-1], 3) if latencies else None
+    }
+
+
+def benchmark(corpus):
+    """
+    Time parse_row and each extractor over a corpus
+    """
+    rows = [(row,) for row in corpus]
+    splits = [parser.split_products(row) for row in corpus]
+    sections = [
+        (section, main_description)
+        for main_description, product_sections in splits
+        for section in product_sections
+    ]
+    return {
+        "parse_row": time_calls(parser.parse_row, rows),
+        "extract_global_attributes": time_calls(parser.extract_global_attributes, rows),
+        "split_products": time_calls(parser.split_products, rows),
+        "extract_main_description": time_calls(parser.extract_main_description, rows),
+        "extract_contextual_values": time_calls(parser.extract_contextual_values, rows),
+        "parse_individual_product": time_calls(parser.parse_individual_product, sections)
+    }
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Benchmark parser.py on a synthetic customs corpus")
+    arg_parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000],
+                            help="corpus sizes (rows) to benchmark")
+    arg_parser.add_argument('--seed', type=int, default=0)
+    arg_parser.add_argument('--output', default='bench_results.json',
+                            help="JSON file the results are written to")
+    arg_parser.add_argument('--write-corpus',
+                            help="also write the largest corpus to this file, one line per row")
+    args = arg_parser.parse_args()
+
+    results = {
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "seed": args.seed,
+        "runs": []
+    }
+    for size in args.sizes:
+        corpus = generate_corpus(size, args.seed)
+        print(f"Corpus of {size} rows ({sum(map(len, corpus)) / size:.0f} chars/row on average)")
+        timings = benchmark(corpus)
+        for name, stats in timings.items():
+            print(f"  {name:<32} {stats['rows_per_second']:>10} rows/s  "
+                  f"p50 {stats['p50_us']:>9} us  p99 {stats['p99_us']:>10} us  errors {stats['errors']}")
+        results["runs"].append({"size": size, "timings": timings})
+
+    if args.write_corpus:
+        with open(args.write_corpus, 'w', encoding='utf-8') as f:
+            f.write("\n".join(generate_corpus(max(args.sizes), args.seed)) + "\n")
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to '{os.path.abspath(args.output)}'.")
+
+
+if __name__ == "__main__":
+    main()
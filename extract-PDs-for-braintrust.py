@@ -1,5 +1,14 @@
 import pandas as pd
 import os
+import io
+import csv
+import json
+import hashlib
+import importlib.util
+import sys
+import zlib
+from xml.sax.saxutils import escape
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 # Define the list of HSN code prefixes to exclude
 excluded_prefixes = [
@@ -14,56 +23,649 @@ excluded_prefixes = [
     "2844", "31", "6904", "6905", "6906", "6910", "6911", "6912", "6913", "7009", "7010", "7013", "7015", "7016", "7019"
 ]
 
+# Group the prefixes by length, dropping duplicates and prefixes already
+# covered by a shorter one, so a code is checked with one set lookup per length
+def group_prefixes(prefixes):
+    groups = {}
+    for prefix in sorted(set(prefixes), key=len):
+        if not any(prefix[:length] in group for length, group in groups.items()):
+            groups.setdefault(len(prefix), set()).add(prefix)
+    return sorted(groups.items())
+
+excluded_prefix_groups = group_prefixes(excluded_prefixes)
+
 # Function to check if HSN code starts with any of the excluded prefixes
 def is_excluded(hsn_code):
-    for prefix in excluded_prefixes:
-        if str(hsn_code).startswith(prefix):
+    hsn_code = str(hsn_code)
+    for length, prefixes in excluded_prefix_groups:
+        if hsn_code[:length] in prefixes:
             return True
     return False
 
-# Split a DataFrame into chunks to ensure each file is < 200 MB
-def split_dataframe(df, chunk_size=200):
-    chunk_rows = chunk_size * 1024 * 1024 // (len(df.columns) * 8)  # Approximate rows per chunk
-    return [df.iloc[i:i + chunk_rows] for i in range(0, len(df), chunk_rows)]
+# Vectorized is_excluded: classify a whole column of HSN codes at once
+def excluded_mask(hsn_codes):
+    hsn_codes = hsn_codes.astype(str)
+    mask = pd.Series(False, index=hsn_codes.index)
+    for length, prefixes in excluded_prefix_groups:
+        mask |= hsn_codes.str[:length].isin(prefixes)
+    return mask
+
+# Columns kept in the filtered output
+output_columns = ['Product_description', 'HSN_Code']
+
+output_formats = ("xlsx", "csv", "parquet", "jsonl")
+
+# Target size of each output part, in MB
+part_size_mb = 200
+
+# Rows per sheet allowed by Excel, header included
+xlsx_max_rows = 1048576
+
+# Compressed output the deflate stream can still be holding back, plus the
+# other files of the xlsx container
+xlsx_deflate_lag = 64 * 1024
+
+# Parquet parts are written in row groups of this many rows
+parquet_row_group = 100000
+
+# None for empty cells, including the NaN pandas reads them as
+def cell_value(value):
+    if value is None or (isinstance(value, float) and value != value):
+        return None
+    return value
+
+# Writes kept rows into numbered part files of one format, starting a new
+# part when the next rows would take the current one past part_size MB.
+# CSV and JSONL rows are measured as the exact bytes written, xlsx rows by
+# deflating the sheet XML they add like the zip container does, and
+# parquet parts by the file size after every row group
+class PartWriter:
+    def __init__(self, file_name, output_directory, report, output_format="xlsx", part_size=part_size_mb,
+                 skip_rows=0, checkpoint_path=None, checkpoint=None, columns=output_columns):
+        self.file_name = file_name
+        self.output_directory = output_directory
+        self.report = report
+        self.output_format = output_format
+        self.columns = columns
+        self.target_bytes = part_size * 1024 * 1024
+        self.part = None
+        self.path = None
+        self.part_rows = 0
+        self.part_bytes = 0
+        self.pending = []  # Rows of the parquet row group being built
+        self.last_group_bytes = 0
+        # Rows already saved by an earlier, interrupted run
+        self.skip_rows = skip_rows
+        # Progress is saved here after every part, so the file can be resumed
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint = checkpoint
+    
+    # Bytes a row takes in the part, and the data to write for csv/jsonl
+    def serialize(self, row):
+        if self.output_format == "csv":
+            buffer = io.StringIO()
+            csv.writer(buffer).writerow(row)
+            data = buffer.getvalue().encode('utf-8')
+        elif self.output_format == "jsonl":
+            data = (json.dumps(dict(zip(self.columns, row)), ensure_ascii=False, default=str) + "\n").encode('utf-8')
+        else:
+            # xlsx: compressed size of the row as openpyxl writes it to the sheet XML
+            from openpyxl.utils import get_column_letter
+            
+            number = self.part_rows + 2
+            xml = "".join(f'<c r="{get_column_letter(i + 1)}{number}" t="inlineStr"><is><t>{escape(str(value))}</t></is></c>'
+                          for i, value in enumerate(row) if value is not None)
+            compressed = len(self.compressor.compress(f'<row r="{number}">{xml}</row>'.encode('utf-8')))
+            return compressed, None
+        return len(data), data
+    
+    def write_row(self, row):
+        if self.skip_rows:
+            self.skip_rows -= 1
+            return
+        row = [cell_value(value) for value in row]
+        if self.output_format == "parquet":
+            self.pending.append(row)
+            if len(self.pending) >= parquet_row_group:
+                self.write_row_group()
+            return
+        
+        if self.output_format == "xlsx":
+            # The compressed size of a row is only known once it's added
+            if self.part is not None and (self.part_bytes + xlsx_deflate_lag >= self.target_bytes or
+                                          self.part_rows >= xlsx_max_rows - 1):
+                self.close_part()
+            if self.part is None:
+                self.open_part()
+            self.sheet.append(row)
+            self.part_bytes += self.serialize(row)[0]
+            self.part_rows += 1
+            return
+        
+        size, data = self.serialize(row)
+        if self.part is not None and self.part_bytes + size > self.target_bytes:
+            self.close_part()
+        if self.part is None:
+            self.open_part()
+        self.part.write(data)
+        self.part_rows += 1
+        self.part_bytes += size
+    
+    def write_rows(self, rows):
+        for row in rows:
+            self.write_row(row)
+    
+    def write_row_group(self):
+        import pyarrow as pa
+        
+        # Assume the next row group is as large as the last one
+        if self.part is not None and self.part_bytes + self.last_group_bytes > self.target_bytes:
+            self.close_part()
+        if self.part is None:
+            self.open_part()
+        
+        table = pa.table({
+            column: pa.array([None if row[i] is None else str(row[i]) for row in self.pending], pa.string())
+            for i, column in enumerate(self.columns)
+        })
+        self.part.write_table(table)
+        self.part_rows += len(self.pending)
+        self.pending = []
+        size = self.sink.tell()
+        self.last_group_bytes = size - self.part_bytes
+        self.part_bytes = size
+    
+    def open_part(self):
+        output_file_name = (f"filtered_{os.path.splitext(self.file_name)[0]}"
+                            f"_part_{len(self.report['parts']) + 1}.{self.output_format}")
+        self.path = os.path.join(self.output_directory, output_file_name)
+        self.part_rows = 0
+        self.part_bytes = 0
+        
+        if self.output_format == "xlsx":
+            from openpyxl import Workbook
+            self.part = Workbook(write_only=True)
+            self.sheet = self.part.create_sheet("Sheet1")
+            self.sheet.append(self.columns)
+            self.compressor = zlib.compressobj()
+        elif self.output_format == "parquet":
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            self.sink = open(self.path, 'wb')
+            self.part = pq.ParquetWriter(self.sink, pa.schema([(column, pa.string()) for column in self.columns]))
+        else:
+            self.part = open(self.path, 'wb')
+            if self.output_format == "csv":
+                self.part_bytes, data = self.serialize(self.columns)
+                self.part.write(data)
+    
+    def close_part(self):
+        if self.output_format == "xlsx":
+            self.part.save(self.path)
+        elif self.output_format == "parquet":
+            self.part.close()
+            self.sink.close()
+        else:
+            self.part.close()
+        self.report["parts"].append((self.path, self.part_rows))
+        self.report["rows"] += self.part_rows  # Counter for rows exported
+        self.part = None
+        if self.checkpoint_path:
+            save_json(self.checkpoint_path, {**self.checkpoint, "parts": self.report["parts"],
+                                             "rows": self.report["rows"]})
+    
+    def close(self):
+        if self.pending:
+            self.write_row_group()
+        if self.part is not None:
+            self.close_part()
+    
+    # Drop the unfinished part after an error, keeping the finished ones
+    def discard(self):
+        if self.part is not None:
+            if self.output_format == "parquet":
+                self.part.close()
+                self.sink.close()
+            elif self.output_format != "xlsx":
+                self.part.close()
+            if os.path.exists(self.path):
+                os.remove(self.path)
+        self.part = None
+        self.pending = []
+
+# parser.py from next to this script, loaded once per process. It's loaded
+# by path: up to Python 3.9 "import parser" can get the standard library's
+# parser module instead, which Windows builds have built in
+def load_parser():
+    module = sys.modules.get("customs_parser")
+    if module is None:
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "parser.py")
+        spec = importlib.util.spec_from_file_location("customs_parser", path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules["customs_parser"] = module
+        spec.loader.exec_module(module)
+    return module
+
+# Runs the description of every kept row through parser.py's parse_row and
+# hands one row per parsed product, with the HSN code carried through, to
+# the part writer. Descriptions that fail to parse are counted and skipped,
+# like parser.py does with lines. There is no time budget: a resumed run
+# skips the products saved before, so every run has to find the same ones.
+# The row length cap alone keeps slow rows bounded
+class ParsingWriter:
+    def __init__(self, writer, report):
+        self.parser = load_parser()
+        self.writer = writer
+        self.report = report
+        self.cache = self.parser.ParseCache()
+    
+    def write_row(self, row):
+        description, hsn_code = row
+        description = cell_value(description)
+        text = str(description).strip() if description is not None else ""
+        if not text:
+            return
+        try:
+            products, _ = self.parser.parse_row_cached(text, self.cache, time_budget=0)
+        except Exception:
+            self.report["parse_errors"] += 1
+            return
+        for product in products:
+            self.writer.write_row([hsn_code] + [product.get(column) for column in self.parser.OUTPUT_COLUMNS])
+    
+    def write_rows(self, rows):
+        for row in rows:
+            self.write_row(row)
+    
+    def close(self):
+        self.writer.close()
+    
+    def discard(self):
+        self.writer.discard()
+
+# Yield the rows of a workbook's first sheet as lists of cell values, one
+# row at a time, so the workbook is never loaded as a whole
+def iter_workbook_rows(file_path):
+    if file_path.endswith(".xlsb"):
+        from pyxlsb import open_workbook
+        with open_workbook(file_path) as workbook:
+            with workbook.get_sheet(1) as sheet:
+                for row in sheet.rows():
+                    yield [cell.v for cell in row]
+    else:
+        from openpyxl import load_workbook
+        workbook = load_workbook(file_path, read_only=True)
+        try:
+            for row in workbook.worksheets[0].iter_rows(values_only=True):
+                yield list(row)
+        finally:
+            workbook.close()
+
+# The text of an HSN code cell, the same whether the workbook is loaded
+# whole or streamed: whole floats are written as ints (pd.read_excel loads
+# a column with blank cells as floats) and empty cells become 'nan'
+def hsn_code_text(value):
+    if value is None:
+        return 'nan'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+# Rows per record batch in the workbook cache
+cache_batch_rows = 100000
+
+# Cached columns of a workbook, keyed by its content hash. Version 2 has
+# the HSN codes of hsn_code_text whichever mode built it
+def cache_file_path(cache_directory, source):
+    return os.path.join(cache_directory, f"{source['sha256']}.v2.arrow")
+
+# Writes the filter columns of a workbook to an uncompressed Arrow IPC file
+# as they are read, so later runs can memory-map it instead of decoding the
+# workbook again. The file only gets its final name once it is complete
+class WorkbookCacheWriter:
+    def __init__(self, path):
+        import pyarrow as pa
+        
+        self.path = path
+        self.temporary_path = f"{path}.{os.getpid()}.tmp"
+        self.schema = pa.schema([(column, pa.string()) for column in output_columns])
+        self.sink = open(self.temporary_path, 'wb')
+        self.writer = pa.ipc.new_file(self.sink, self.schema)
+        self.pending = []
+    
+    def add_row(self, row):
+        self.pending.append([None if cell_value(value) is None else str(value) for value in row])
+        if len(self.pending) >= cache_batch_rows:
+            self.flush()
+    
+    def flush(self):
+        import pyarrow as pa
+        
+        if self.pending:
+            columns = [pa.array([row[i] for row in self.pending], pa.string()) for i in range(len(output_columns))]
+            self.writer.write_batch(pa.record_batch(columns, schema=self.schema))
+            self.pending = []
+    
+    def close(self):
+        self.flush()
+        self.writer.close()
+        self.sink.close()
+        os.replace(self.temporary_path, self.path)
+    
+    def discard(self):
+        self.sink.close()
+        if os.path.exists(self.temporary_path):
+            os.remove(self.temporary_path)
+
+# Filter a cached workbook batch by batch into the part writer
+def filter_cached(cache_path, writer, report):
+    import pyarrow as pa
+    
+    with pa.memory_map(cache_path) as source:
+        reader = pa.ipc.open_file(source)
+        for i in range(reader.num_record_batches):
+            batch = reader.get_batch(i).to_pandas()
+            report["rows_read"] += len(batch)
+            filtered_df = batch[~excluded_mask(batch['HSN_Code'])]
+            writer.write_rows(filtered_df.itertuples(index=False, name=None))
+
+# Filter a workbook row by row into the part writer, and into the cache
+# writer if one is given. Only the current row is held in memory, whatever
+# the size of the workbook
+def stream_file(file_path, file_name, writer, report, cache=None):
+    rows = iter_workbook_rows(file_path)
+    header = next(rows, [])
+    if 'HSN_Code' not in header or 'Product_description' not in header:
+        report["error"] = f"Columns 'HSN_Code' or 'Product_description' not found in {file_name}"
+        return
+    hsn_index = header.index('HSN_Code')
+    description_index = header.index('Product_description')
+    
+    for row in rows:
+        report["rows_read"] += 1
+        hsn_code = hsn_code_text(row[hsn_index] if hsn_index < len(row) else None)
+        description = row[description_index] if description_index < len(row) else None
+        if cache is not None:
+            cache.add_row([description, hsn_code])
+        if not is_excluded(hsn_code):
+            writer.write_row([description, hsn_code])
 
 # Input and output directories
 input_directory = r"C:\Users\Jamal\Downloads\Telegram Desktop\clean-all-inesen"
 output_directory = r"C:\Users\Jamal\Downloads\Telegram Desktop\clean-all-inesen\done"
 
-# Ensure the output directory exists
-os.makedirs(output_directory, exist_ok=True)
+excel_extensions = (".xls", ".xlsx", ".xlsb")
 
-# Process each file in the directory
-for file_name in os.listdir(input_directory):
-    if file_name.endswith((".xls", ".xlsx", ".xlsb")):
-        file_path = os.path.join(input_directory, file_name)
-        print(f"Processing file: {file_name}")
-        
-        try:
-            # Choose the appropriate engine for reading the file
-            if file_name.endswith(".xlsb"):
-                df = pd.read_excel(file_path, engine="pyxlsb")
-            else:
-                df = pd.read_excel(file_path, engine="openpyxl")
+# Record of the processed input files, kept in the output directory
+manifest_name = "manifest.json"
+
+# Write JSON through a temporary file, so a crash never leaves half a file
+def save_json(path, data):
+    temporary_path = path + ".tmp"
+    with open(temporary_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(temporary_path, path)
+
+def load_json(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def file_hash(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+# Size, modification time and content hash of an input file
+def source_info(file_path, with_hash=True):
+    stat = os.stat(file_path)
+    info = {"size": stat.st_size, "mtime": stat.st_mtime}
+    if with_hash:
+        info["sha256"] = file_hash(file_path)
+    return info
+
+# Everything besides the input file that decides what ends up in the parts.
+# Parts made with other settings can't be reused
+def run_settings(output_format, part_size, parse=False):
+    prefixes = ",".join(sorted(prefix for _, group in excluded_prefix_groups for prefix in group))
+    settings = {
+        "format": output_format,
+        "part_size": part_size,
+        "parse": parse,
+        "excluded_prefixes": hashlib.sha256(prefixes.encode()).hexdigest()
+    }
+    if parse:
+        # Another parser or rule file finds other products
+        settings["parser"] = load_parser().parser_fingerprint()
+    return settings
+
+# Whether a manifest entry still describes the input file. The hash is only
+# computed when the size matches but the modification time doesn't
+def is_up_to_date(entry, file_path):
+    if not entry:
+        return False
+    info = source_info(file_path, with_hash=False)
+    if info["size"] != entry["size"]:
+        return False
+    if info["mtime"] == entry["mtime"]:
+        return True
+    if file_hash(file_path) == entry["sha256"]:
+        entry["mtime"] = info["mtime"]
+        return True
+    return False
+
+def remove_parts(parts):
+    for output_file_path, _ in parts:
+        if os.path.exists(output_file_path):
+            os.remove(output_file_path)
+
+# Filter one workbook and save the kept rows in parts of output_format,
+# reading it row by row if stream is set. Returns a report instead of
+# printing, so files handled in parallel don't mix their output.
+# A file interrupted in an earlier run with the same settings is resumed
+# after its last saved part; otherwise previous_parts, the parts of an
+# older version of the file, are removed first. With a cache_directory,
+# the workbook's columns are read from its cached copy once there is one.
+# With parse set, the parts hold the products parse_row finds in each kept
+# description instead of the description itself
+def process_file(file_name, input_directory, output_directory, stream=False,
+                 output_format="xlsx", part_size=part_size_mb, previous_parts=(), cache_directory=None,
+                 parse=False):
+    file_path = os.path.join(input_directory, file_name)
+    report = {"file_name": file_name, "parts": [], "rows": 0, "rows_read": 0, "error": None,
+              "resumed": False, "cached": False, "parse_errors": 0}
+    
+    try:
+        settings = run_settings(output_format, part_size, parse)
+        report["source"] = source_info(file_path)
+        checkpoint_path = os.path.join(output_directory, f"filtered_{os.path.splitext(file_name)[0]}.progress.json")
+        checkpoint = load_json(checkpoint_path)
+        if checkpoint and checkpoint["source"] == report["source"] and checkpoint["settings"] == settings:
+            report["parts"] = checkpoint["parts"]
+            report["rows"] = checkpoint["rows"]
+            report["resumed"] = True
+        else:
+            remove_parts(list(previous_parts) + (checkpoint["parts"] if checkpoint else []))
+        columns = output_columns
+        if parse:
+            columns = ["HSN_Code"] + load_parser().OUTPUT_COLUMNS
+        writer = PartWriter(file_name, output_directory, report, output_format, part_size,
+                            skip_rows=report["rows"], checkpoint_path=checkpoint_path,
+                            checkpoint={"source": report["source"], "settings": settings}, columns=columns)
+        if parse:
+            writer = ParsingWriter(writer, report)
+    except Exception as e:
+        report["error"] = f"Error processing file {file_name}: {e}"
+        return report
+    
+    cache = None
+    try:
+        cache_path = cache_file_path(cache_directory, report["source"]) if cache_directory else None
+        if cache_path and os.path.exists(cache_path):
+            report["cached"] = True
+            filter_cached(cache_path, writer, report)
+        elif stream:
+            cache = WorkbookCacheWriter(cache_path) if cache_path else None
+            stream_file(file_path, file_name, writer, report, cache)
+        else:
+            # Choose the appropriate engine for reading the file. HSN codes
+            # are read as the cells hold them, so text codes keep their
+            # leading zeros like in stream_file
+            engine = "pyxlsb" if file_name.endswith(".xlsb") else "openpyxl"
+            df = pd.read_excel(file_path, engine=engine, dtype={'HSN_Code': object})
             
             # Filter rows based on HSN codes
             if 'HSN_Code' in df.columns and 'Product_description' in df.columns:
-                df['HSN_Code'] = df['HSN_Code'].astype(str)
-                filtered_df = df[~df['HSN_Code'].apply(is_excluded)][['Product_description', 'HSN_Code']]
-                
-                total_exported_rows = 0  # Counter for rows exported
+                report["rows_read"] = len(df)
+                df['HSN_Code'] = df['HSN_Code'].map(hsn_code_text)
+                if cache_path:
+                    cache = WorkbookCacheWriter(cache_path)
+                    for row in df[output_columns].itertuples(index=False, name=None):
+                        cache.add_row(row)
+                filtered_df = df[~excluded_mask(df['HSN_Code'])][output_columns]
                 
                 # Split and save the filtered data
-                chunks = split_dataframe(filtered_df)
-                for i, chunk in enumerate(chunks):
-                    output_file_name = f"filtered_{os.path.splitext(file_name)[0]}_part_{i + 1}.xlsx"
-                    output_file_path = os.path.join(output_directory, output_file_name)
-                    chunk.to_excel(output_file_path, index=False)
-                    print(f"  Saved part {i + 1} with {len(chunk)} rows to: {output_file_path}")
-                    total_exported_rows += len(chunk)
-                
-                print(f"Finished processing {file_name}. Total rows exported: {total_exported_rows}")
+                writer.write_rows(filtered_df.itertuples(index=False, name=None))
             else:
-                print(f"Columns 'HSN_Code' or 'Product_description' not found in {file_name}")
-        except Exception as e:
-            print(f"Error processing file {file_name}: {e}")
+                report["error"] = f"Columns 'HSN_Code' or 'Product_description' not found in {file_name}"
+        
+        if not report["error"]:
+            writer.close()
+            if cache is not None:
+                cache.close()
+            if os.path.exists(checkpoint_path):
+                os.remove(checkpoint_path)
+        elif cache is not None:
+            cache.discard()
+    except Exception as e:
+        writer.discard()
+        if cache is not None:
+            cache.discard()
+        report["error"] = f"Error processing file {file_name}: {e}"
+    
+    return report
+
+# Print the outcome of a file and how far along the run is
+def print_report(report, files_done, total_files):
+    if report["resumed"]:
+        print(f"  Resumed {report['file_name']} after an interrupted run")
+    if report["cached"]:
+        print(f"  Read {report['file_name']} from the workbook cache")
+    for i, (output_file_path, rows) in enumerate(report["parts"]):
+        print(f"  Saved part {i + 1} with {rows} rows to: {output_file_path}")
+    if report.get("parse_errors"):
+        print(f"  {report['parse_errors']} descriptions could not be parsed")
+    if report["error"]:
+        print(report["error"])
+    else:
+        print(f"Finished processing {report['file_name']}. Total rows exported: {report['rows']}")
+    print(f"[{files_done}/{total_files} files done]")
+
+# Process every workbook in input_directory, on a pool of worker processes
+# unless workers is 1 (workers=None uses every core). Files the manifest
+# shows as done with the same settings are skipped unless force is set
+def process_directory(input_directory, output_directory, workers=1, stream=False,
+                      output_format="xlsx", part_size=part_size_mb, force=False, cache_directory=None,
+                      parse=False):
+    # Ensure the output directory exists
+    os.makedirs(output_directory, exist_ok=True)
+    if cache_directory:
+        os.makedirs(cache_directory, exist_ok=True)
+    
+    manifest_path = os.path.join(output_directory, manifest_name)
+    settings = run_settings(output_format, part_size, parse)
+    manifest = load_json(manifest_path)
+    if not manifest or manifest["settings"] != settings:
+        # Parts made with other settings are replaced as their files come up
+        previous = manifest["files"] if manifest else {}
+        manifest = {"settings": settings, "files": {}}
+    else:
+        previous = manifest["files"]
+    
+    file_names = []
+    for file_name in sorted(f for f in os.listdir(input_directory) if f.endswith(excel_extensions)):
+        if not force and manifest["files"].get(file_name) and \
+                is_up_to_date(manifest["files"][file_name], os.path.join(input_directory, file_name)):
+            print(f"Skipping unchanged file: {file_name}")
+        else:
+            file_names.append(file_name)
+    
+    def record(report):
+        reports.append(report)
+        if not report["error"]:
+            manifest["files"][report["file_name"]] = {
+                **report["source"],
+                "rows_read": report["rows_read"],
+                "rows": report["rows"],
+                "parse_errors": report["parse_errors"],
+                "parts": report["parts"]
+            }
+            save_json(manifest_path, manifest)
+        print_report(report, len(reports), len(file_names))
+    
+    def previous_parts(file_name):
+        return previous.get(file_name, {}).get("parts", [])
+    
+    reports = []
+    if workers == 1:
+        for file_name in file_names:
+            print(f"Processing file: {file_name}")
+            record(process_file(file_name, input_directory, output_directory, stream,
+                                output_format, part_size, previous_parts(file_name), cache_directory,
+                                parse))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {}
+            for file_name in file_names:
+                print(f"Processing file: {file_name}")
+                futures[executor.submit(process_file, file_name, input_directory, output_directory,
+                                        stream, output_format, part_size,
+                                        previous_parts(file_name), cache_directory, parse)] = file_name
+            
+            for future in as_completed(futures):
+                file_name = futures[future]
+                try:
+                    report = future.result()
+                except Exception as e:
+                    # The worker process itself died, e.g. out of memory
+                    report = {"file_name": file_name, "parts": [], "rows": 0, "rows_read": 0,
+                              "error": f"Error processing file {file_name}: {e}",
+                              "resumed": False, "cached": False, "parse_errors": 0}
+                record(report)
+    
+    failed = [report["file_name"] for report in reports if report["error"]]
+    print(f"\nProcessed {len(reports)} files. Total rows exported: {sum(report['rows'] for report in reports)}")
+    if failed:
+        print(f"{len(failed)} files failed: {', '.join(failed)}")
+    return reports
+
+if __name__ == "__main__":
+    import argparse
+    
+    arg_parser = argparse.ArgumentParser(description="Filter customs workbooks by HSN code")
+    arg_parser.add_argument('input_directory', nargs='?', default=input_directory)
+    arg_parser.add_argument('output_directory', nargs='?', default=output_directory)
+    arg_parser.add_argument('--workers', type=int, default=1,
+                            help="workbooks processed at once, one per process (0 = all cores)")
+    arg_parser.add_argument('--stream', action='store_true',
+                            help="read workbooks row by row instead of loading them whole")
+    arg_parser.add_argument('--format', choices=output_formats, default="xlsx",
+                            help="file format of the output parts")
+    arg_parser.add_argument('--part-size', type=float, default=part_size_mb,
+                            help="target size of each output part, in MB")
+    arg_parser.add_argument('--force', action='store_true',
+                            help="reprocess every file, even the ones the manifest shows as done")
+    arg_parser.add_argument('--cache-dir',
+                            help="keep a columnar copy of every workbook here, read instead of the "
+                                 "workbook on later runs")
+    arg_parser.add_argument('--parse', action='store_true',
+                            help="run the kept descriptions through parser.py and save the parsed "
+                                 "products with their HSN code")
+    args = arg_parser.parse_args()
+    
+    process_directory(args.input_directory, args.output_directory, args.workers or None, args.stream,
+                      args.format, args.part_size, args.force, args.cache_dir, args.parse)
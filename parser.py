@@ -1,32 +1,247 @@
 import re
 import pandas as pd
 import chardet
+import codecs
 import os
 import sys
+import time
+import json
+import heapq
+import hashlib
+import sqlite3
+from array import array
+from collections import Counter, OrderedDict, defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+# Compiled pattern registry. Everything here is compiled once, when the rule
+# file is loaded; the extractors below look patterns up by name instead of
+# handing raw strings (and flags) to re on every row.
+I = re.IGNORECASE
+
+# Rule file holding the patterns, keyword anchors and units of the
+# extractors. Another file can be loaded with load_rules() (--rules on the
+# command line) to tune extraction for a customs source without code changes.
+DEFAULT_RULES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'parsing_rules.json')
+
+# Rule file currently loaded
+RULES_FILE = None
+
+# The tables below are filled in place by load_rules(), so functions that
+# take one of them as a default argument always see the current rules.
+
+# Compiled patterns by name. A list is a family of patterns tried in order.
+PATTERNS = {}
+
+# Keyword anchors located by scan_anchors(), as lowercase literals. Every
+# keyword that an anchored pattern can start with is listed here once.
+ANCHORS = {}
+
+# Anchors each pattern in a PATTERNS family can start with, in the same order
+# as the family. None marks patterns without a keyword anchor, which are always
+# searched over the whole text.
+PATTERN_ANCHORS = {}
+
+# Anchors scan_anchors() has to look up for each anchored family
+FAMILY_ANCHOR_NAMES = {}
+
+# Anchors of the manufacturer, brand and country families
+GLOBAL_ANCHOR_NAMES = ()
+
+# Keywords for the families whose values can come before the keyword, so
+# their patterns can't start at an anchor offset. Every pattern of a family
+# needs at least one of its keywords: a family is skipped when none occur
+# and otherwise searched over the whole text as before.
+FAMILY_KEYWORDS = {}
+
+# (pattern, flags) templates that remove an extracted value together with
+# its keyword, with {value} standing for the escaped value
+VALUE_REMOVAL = []
+
+# Keyword/value rules used by smart_extract_values and its helpers
+PARSING_RULES = {}
+
+# Characters that re.IGNORECASE treats as equal to a letter used in the
+# keywords but that str.lower() leaves alone (Cyrillic rounded ve, tall te,
+# ..., dotless i, long s)
+CASE_FOLD_VARIANTS = re.compile('[\u1c80-\u1c88\u0131\u017f]')
+
+# Fields of extract_contextual_values and the PATTERNS family of each
+CONTEXTUAL_FAMILIES = {
+    'article_number': 'contextual_article_number',
+    'weight': 'contextual_weight',
+    'quantity': 'contextual_quantity'
+}
+
+class RowTimeout(Exception):
+    """
+    Raised when parsing a row runs past its time budget
+    """
+
+
+# perf_counter() deadline for the row being parsed, None when unbounded
+ROW_DEADLINE = None
+
+
+def check_budget():
+    """
+    Raise RowTimeout once the current row has used up its time budget.
+    Called between pattern calls: CPython can't interrupt a single regex
+    call, so this bounds the time spent across the many calls a row makes.
+    """
+    if ROW_DEADLINE is not None and time.perf_counter() > ROW_DEADLINE:
+        raise RowTimeout()
+
+
+def scan_anchors(text, names=ANCHORS):
+    """
+    Find the first offset of every keyword anchor in the text, or only of
+    the named ones.
+    Each keyword is looked up with str.find on the lowercased text, which
+    stops at its first occurrence and runs at C speed. A combined regex pass
+    over the row measured several times slower than this.
+    """
+    lowered = text.lower()
+    if len(lowered) != len(text) or CASE_FOLD_VARIANTS.search(text):
+        # Offsets or case-insensitive matches can't be trusted,
+        # so treat every anchor as present from the start
+        return dict.fromkeys(names, 0)
+
+    anchors = {}
+    for name in names:
+        offset = lowered.find(ANCHORS[name])
+        if offset >= 0:
+            anchors[name] = offset
+    return anchors
+
+
+def scan_families(text, families=FAMILY_KEYWORDS):
+    """
+    The families, out of the given ones, that can match the text because
+    at least one of their FAMILY_KEYWORDS occurs in it. A family without
+    keywords can always match.
+    The text is lowercased once and each family stops at its first keyword
+    found, the same str.find approach as scan_anchors.
+    """
+    lowered = text.lower()
+    if len(lowered) != len(text) or CASE_FOLD_VARIANTS.search(text):
+        return set(families)
+    return {
+        family for family in families
+        if family not in FAMILY_KEYWORDS or any(keyword in lowered for keyword in FAMILY_KEYWORDS[family])
+    }
+
+def overlaps(start, end, spans):
+    return any(start < span_end and span_start < end for span_start, span_end in spans)
+
+
+def search_outside(pattern, text, spans, pos=0):
+    """
+    First match of a pattern at or after pos that doesn't overlap any of
+    the (start, end) spans
+    """
+    match = pattern.search(text, pos)
+    while match and spans:
+        start, end = match.span()
+        inside = [span_end for span_start, span_end in spans if span_start <= start < span_end]
+        if inside:
+            # Nothing starting inside a taken span can be used
+            pos = max(inside)
+        elif overlaps(start, end, spans):
+            pos = start + 1
+        else:
+            break
+        match = pattern.search(text, pos)
+    return match
+
+
+def cut_spans(text, spans):
+    """
+    The text with every span cut out, built in a single pass
+    """
+    pieces = []
+    position = 0
+    for start, end in sorted(spans):
+        if start > position:
+            pieces.append(text[position:start])
+        position = max(position, end)
+    pieces.append(text[position:])
+    return ''.join(pieces)
+
+
+def first_match(family, text, anchors=None, spans=()):
+    """
+    Return the match of the first pattern in a PATTERNS family that matches,
+    trying the patterns in order like the extractors always did.
+    Anchored patterns are skipped when none of their keywords occur and are
+    otherwise searched from the first keyword occurrence instead of offset 0.
+    Matches overlapping one of the spans (text another extractor already
+    took) are passed over.
+    """
+    pattern_anchors = PATTERN_ANCHORS.get(family)
+    if pattern_anchors is None:
+        pattern_anchors = [None] * len(PATTERNS[family])
+    elif anchors is None:
+        anchors = scan_anchors(text, FAMILY_ANCHOR_NAMES[family])
+
+    for pattern, keywords in zip(PATTERNS[family], pattern_anchors):
+        check_budget()
+        if keywords is None:
+            start = 0
+        else:
+            offsets = [anchors[k] for k in keywords if k in anchors]
+            if not offsets:
+                continue
+            # Some patterns allow a word prefix before the keyword,
+            # so start from the beginning of the word
+            start = min(offsets)
+            while start and not text[start - 1].isspace():
+                start -= 1
+        match = pattern.search(text, start)
+        if match and spans and overlaps(*match.span(), spans):
+            match = search_outside(pattern, text, spans, match.start())
+        if match:
+            return match
+    return None
+
+@lru_cache(maxsize=4096)
+def removal_patterns_for(value):
+    """
+    Compiled patterns that remove an extracted value together with its keyword.
+    Cached per value, since the same values repeat across rows.
+    """
+    value = re.escape(value)
+    return [re.compile(pattern.replace('{value}', value), flags) for pattern, flags in VALUE_REMOVAL]
+
+@lru_cache(maxsize=None)
+def keyword_value_pattern(keyword):
+    """
+    Compiled pattern that captures a value before or after a keyword
+    """
+    return re.compile(rf"""
+        # Look before keyword
+        (?:
+            ([\w\d\-\.]+(?:\s*[\-,\.]\s*[\w\d\-\.]+)*)  # Value before
+            \s*{keyword}
+        )|
+        # Look after keyword
+        (?:
+            {keyword}\s*
+            ([\w\d\-\.]+(?:\s*[\-,\.]\s*[\w\d\-\.]+)*)  # Value after
+        )
+    """, re.VERBOSE | I)
 
 def clean_description_from_extracted_values(description, extracted_values):
     """
     Remove extracted values from the description
     """
     for category, value in extracted_values.items():
-        # Create patterns to remove the entire match
-        removal_patterns = [
-            # Keyword before value
-            rf'(?:арт\.|артикул|код)\s*[:.]?\s*{re.escape(str(value))}',
-            rf'(?:вага|weight|нетто)\s*[:.]?\s*{re.escape(str(value))}',
-            rf'(?:кількість|qty|quantity)\s*[:.]?\s*{re.escape(str(value))}',
-            
-            # Value before keyword
-            rf'{re.escape(str(value))}\s*(?:арт\.|артикул|код)',
-            rf'{re.escape(str(value))}\s*(?:кг|kg|г|g)\s*(?:вага|weight|нетто)',
-            rf'{re.escape(str(value))}\s*(?:шт|pcs|одиниць|pieces)'
-        ]
-        
-        for pattern in removal_patterns:
-            description = re.sub(pattern, '', description, flags=re.IGNORECASE)
+        check_budget()
+        for pattern in removal_patterns_for(str(value)):
+            description = pattern.sub('', description)
     
     # Clean up extra spaces and punctuation
-    description = re.sub(r'\s+', ' ', description)
+    description = PATTERNS['whitespace'].sub(' ', description)
     description = description.strip('.,; ')
     
     return description
@@ -35,53 +250,49 @@ def extract_contextual_values(text):
     """
     Extract values associated with specific keywords in various formats
     """
-    # Define patterns for different types of information
+    return {category: value for category, (value, match) in contextual_matches(text).items()}
+
+def contextual_matches(text):
+    """
+    The (value, match) behind every value extract_contextual_values finds
+    """
     patterns = {
-        'article_number': [
-            # Keyword before value
-            r'(?:арт\.|артикул|код)\s*[:.]?\s*([\w\-\.]+)',
-            # Value before keyword
-            r'([\w\-\.]+)\s*(?:арт\.|артикул|код)'
-        ],
-        'weight': [
-            # Keyword before value
-            r'(?:вага|weight|нетто)\s*[:.]?\s*(\d+(?:[.,]\d+)?)\s*(?:кг|kg|г|g)',
-            # Value before keyword
-            r'(\d+(?:[.,]\d+)?)\s*(?:кг|kg|г|g)\s*(?:вага|weight|нетто)'
-        ],
-        'quantity': [
-            # Keyword before value
-            r'(?:кількість|qty|quantity)\s*[:.]?\s*(\d+)',
-            # Value before keyword
-            r'(\d+)\s*(?:шт|pcs|одиниць|pieces)'
-        ]
+        'article_number': PATTERNS['contextual_article_number'],
+        'weight': PATTERNS['contextual_weight'],
+        'quantity': PATTERNS['contextual_quantity']
     }
     
     extracted_values = {}
-    
+
+    # Skip the categories none of whose keywords occur in the text
+    present = scan_families(text, CONTEXTUAL_FAMILIES.values())
+
     for category, keyword_patterns in patterns.items():
+        check_budget()
+        if CONTEXTUAL_FAMILIES[category] not in present:
+            continue
         for pattern in keyword_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
+            match = pattern.search(text)
             if match:
                 value = match.group(1).strip()
                 
                 # Additional validation
                 if category == 'article_number':
                     # Ensure it's a valid article number
-                    if re.match(r'^[\w\-\.]+$', value):
-                        extracted_values[category] = value
+                    if PATTERNS['valid_article_number'].match(value):
+                        extracted_values[category] = value, match
                 elif category == 'weight':
                     # Ensure it's a valid number
                     try:
                         float(value.replace(',', '.'))
-                        extracted_values[category] = f"{value} кг"
+                        extracted_values[category] = f"{value} кг", match
                     except ValueError:
                         pass
                 elif category == 'quantity':
                     # Ensure it's a valid integer
                     try:
                         int(value)
-                        extracted_values[category] = int(value)
+                        extracted_values[category] = int(value), match
                     except ValueError:
                         pass
     
@@ -94,53 +305,23 @@ def extract_main_description(text):
     # First, extract contextual values
     extracted_values = extract_contextual_values(text)
 
-    # List of indicators that signal the end of the main product description
-    end_indicators = [
-        # Quantities and measurements
-        r'\d+\s*(?:кг|kg|г|g|мм|mm|см|cm|м|m)',
-        r'(?:загальн(?:ою|а)\s+(?:вага|кількість|маса))',
-        r'(?:вага|weight|нетто|брутто)',
-        r'в\s+упаковках\s+масою',
-        r'\d+\s*(?:шт|pcs|штук|pieces)',
-        r'\d+\s*(?:мішків|упак|boxes|packs)',
-        
-        # Brand and manufacturer info
-        r'торгов(?:а|ельна)\s+марка',
-        r'виробник',
-        r'країна\s+(?:походження|виробництва)',
-        
-        # Product identifiers
-        r'арт\.',
-        r'артикул',
-        r'код',
-        r'lot',
-        r'партія',
-        
-        # Other technical info
-        r'термін\s+придатності',
-        r'виготовлено',
-        r'контейнер'
-    ]
-    
-    # Create pattern that matches any of these indicators
-    combined_pattern = '|'.join(f'(?:{p})' for p in end_indicators)
-    
-    # Find the first occurrence of any indicator
-    match = re.search(combined_pattern, text, re.IGNORECASE)
+    # Find the first occurrence of any indicator that signals the end
+    # of the main product description
+    match = PATTERNS['end_indicators'].search(text)
     
     if match:
         # Take everything before the first indicator
         main_desc = text[:match.start()].strip()
     else:
         # If no indicators found, take first sentence
-        main_desc = re.split(r'[.!?]', text)[0].strip()
+        main_desc = PATTERNS['sentence_end'].split(text)[0].strip()
     
     # Clean up description by removing extracted values
     main_desc = clean_description_from_extracted_values(main_desc, extracted_values)
     
     # Final cleanup
-    main_desc = re.sub(r'^[\d\.\s]+\.?\s*', '', main_desc)  # remove leading numbers and dots
-    main_desc = re.sub(r'\s+', ' ', main_desc)  # normalize spaces
+    main_desc = PATTERNS['leading_numbering'].sub('', main_desc)  # remove leading numbers and dots
+    main_desc = PATTERNS['whitespace'].sub(' ', main_desc)  # normalize spaces
     main_desc = main_desc.strip('.,; ')
     
     return main_desc
@@ -150,49 +331,180 @@ def extract_value_around_keyword(text, keyword, max_chars=50):
     Extract value that might appear before or after a keyword,
     handling complex values with dashes, commas, etc.
     """
-    # Create pattern that looks both before and after the keyword
-    pattern = f"""
-        # Look before keyword
-        (?:
-            ([\w\d\-\.]+(?:\s*[\-,\.]\s*[\w\d\-\.]+)*)  # Value before
-            \s*{keyword}
-        )|
-        # Look after keyword
-        (?:
-            {keyword}\s*
-            ([\w\d\-\.]+(?:\s*[\-,\.]\s*[\w\d\-\.]+)*)  # Value after
-        )
-    """
-    
-    match = re.search(pattern, text, re.VERBOSE | re.IGNORECASE)
+    match = keyword_value_pattern(keyword).search(text)
     if match:
         # Return the group that matched (before or after)
         return match.group(1) if match.group(1) else match.group(2)
     return None
 
-# Example usage in rules:
-PARSING_RULES = {
-##    'article_numbers': {
-#        'keywords': ['арт', 'артикул', 'код', 'art', 'article','lot', 'лот'],
-#        'value_pattern': r'[\w\d\-\.]+(?:\s*[\-,\.]\s*[\w\d\-\.]+)*'  # Matches complex values
-#    },
-    'model_numbers': {
-        'keywords': ['модель', 'model', 'мод'],
-        'value_pattern': r'[\w\d\-\.]+(?:\s*[\-,\.]\s*[\w\d\-\.]+)*'
-    },
-#    'weight_indicators': {
-#        'keywords': ['вага', 'weight', 'нетто', 'брутто', 'кг', 'kg', 'г', 'g'],
-#        'pattern': r'(?:чиста\s+)?(?:вага|weight|нетто|брутто)?\s*:?\s*(\d+(?:[\.,]\d+)?)\s*(?:кг|kg|г|g)',
-#        'cleanup': True  # Should be removed from technical specs
-#    },
-    'date_indicators': {
-        'keywords': ['врожай', 'виготовлен', 'термін', 'дата'],
-        'pattern': r'(?:врожаю|виготовлене?|термін придатності|дата)\s*:?\s*(\d{1,2}/\d{4}|\d{4})\s*(?:р\.?)?',
-        'cleanup': False  # Keep in technical specs
-    }    
-    # Add more as needed
+# Letters of the "flags" entries in the rule file
+RULE_FLAGS = {'i': re.IGNORECASE, 's': re.DOTALL, 'm': re.MULTILINE, 'x': re.VERBOSE}
+
+# {units.<name>} placeholders in rule file patterns
+UNIT_PLACEHOLDER = re.compile(r'\{units\.(\w+)\}')
+
+
+def rule_flags(letters, name):
+    flags = 0
+    for letter in letters:
+        if letter not in RULE_FLAGS:
+            raise ValueError(f"Rule '{name}' has unknown flag '{letter}'")
+        flags |= RULE_FLAGS[letter]
+    return flags
+
+
+def expand_units(pattern, units, name):
+    """
+    Replace {units.<name>} placeholders with the unit alternation as a group
+    """
+    def unit(match):
+        if match.group(1) not in units:
+            raise ValueError(f"Rule '{name}' uses unknown units '{match.group(1)}'")
+        return f'(?:{units[match.group(1)]})'
+    return UNIT_PLACEHOLDER.sub(unit, pattern)
+
+
+def compile_pattern(spec, units, name, flags=''):
+    """
+    Compile one rule file pattern: a string, or an object with "pattern",
+    "flags" and "any_of". The any_of alternatives are merged into a single
+    alternation that replaces {any_of} in the pattern, or is the pattern.
+    """
+    if isinstance(spec, str):
+        spec = {'pattern': spec}
+    pattern = spec.get('pattern', '{any_of}')
+    if 'any_of' in spec:
+        pattern = pattern.replace('{any_of}', '|'.join(f'(?:{p})' for p in spec['any_of']))
+    try:
+        return re.compile(expand_units(pattern, units, name), rule_flags(spec.get('flags', flags), name))
+    except re.error as e:
+        raise ValueError(f"Rule '{name}' has an invalid pattern: {e}") from e
+
+
+def compile_rules(rules, patterns=PATTERNS):
+    """
+    Compile parsing rules into a pattern registry, PATTERNS by default.
+    The keyword patterns are only compiled to check them: smart_extract_values
+    gets them from the keyword_value_pattern cache.
+    An invalid pattern or keyword raises ValueError naming the rule.
+    """
+    for rule_type, rule in rules.items():
+        try:
+            if 'pattern' in rule:
+                patterns[f'rule_{rule_type}'] = re.compile(rule['pattern'], I)
+            if 'split_pattern' in rule:
+                patterns[f'rule_{rule_type}_split'] = re.compile(rule['split_pattern'])
+            for keyword in rule.get('keywords', []):
+                keyword_value_pattern(keyword)
+        except re.error as e:
+            raise ValueError(f"Rule '{rule_type}' has an invalid pattern: {e}") from e
+
+
+# Patterns the extractors look up, and whether each is a family: a list of
+# patterns tried in order, rather than a single pattern
+REQUIRED_PATTERNS = {
+    **{family: True for family in CONTEXTUAL_FAMILIES.values()},
+    'manufacturer': True,
+    'brand': True,
+    'country': True,
+    'product': True,
+    'quantity': True,
+    'model': True,
+    'weight': True,
+    'packaging': True,
+    'chemical_formula': True,
+    'valid_article_number': False,
+    'whitespace': False,
+    'leading_numbering': False,
+    'sentence_end': False,
+    'end_indicators': False,
+    'has_quantity': False,
+    'quantity_split': False,
+    'has_digit': False,
+    'strip_brand': False,
+    'strip_manufacturer': False,
+    'strip_country': False,
+    'name_dash_quantity': False,
+    'specs_quantity': False,
+    'specs_punctuation': False,
+    'specs_article': False,
+    'specs_quantity_keyword': False,
+    'specs_weight_keyword': False,
+    'specs_multiplier': False
 }
 
+
+def load_rules(path=DEFAULT_RULES_FILE):
+    """
+    Load a rule file and compile it into the pattern registry, replacing the
+    rules loaded before. The whole file is compiled before anything is
+    replaced, so a broken file raises ValueError and leaves the current
+    rules in place.
+    """
+    global RULES_FILE, GLOBAL_ANCHOR_NAMES
+    with open(path, encoding='utf-8') as f:
+        rules = json.load(f)
+
+    if not isinstance(rules.get('patterns'), dict):
+        raise ValueError(f"{path} has no 'patterns' section")
+    units = rules.get('units', {})
+    anchors = {name: keyword.lower() for name, keyword in rules.get('anchors', {}).items()}
+    patterns = {}
+    pattern_anchors = {}
+    family_keywords = {}
+    for name, spec in rules['patterns'].items():
+        if not (isinstance(spec, dict) and 'patterns' in spec):
+            patterns[name] = compile_pattern(spec, units, name)
+            continue
+
+        entries = [entry if isinstance(entry, dict) else {'pattern': entry} for entry in spec['patterns']]
+        patterns[name] = [
+            compile_pattern(entry, units, f'{name}[{i}]', spec.get('flags', ''))
+            for i, entry in enumerate(entries)
+        ]
+        if any('anchors' in entry for entry in entries):
+            for entry in entries:
+                for anchor in entry.get('anchors', ()):
+                    if anchor not in anchors:
+                        raise ValueError(f"Rule '{name}' uses unknown anchor '{anchor}'")
+            pattern_anchors[name] = [tuple(entry['anchors']) if 'anchors' in entry else None for entry in entries]
+        if 'keywords' in spec:
+            family_keywords[name] = tuple(keyword.lower() for keyword in spec['keywords'])
+
+    for name, is_family in REQUIRED_PATTERNS.items():
+        if name not in patterns:
+            raise ValueError(f"Rule '{name}' is missing")
+        if isinstance(patterns[name], list) != is_family:
+            shape = "a list of patterns" if is_family else "a single pattern"
+            raise ValueError(f"Rule '{name}' has to be {shape}")
+
+    removal = rules.get('value_removal', {})
+    value_removal = [
+        (expand_units(pattern, units, 'value_removal'), rule_flags(removal.get('flags', ''), 'value_removal'))
+        for pattern in removal.get('patterns', [])
+    ]
+    parsing_rules = {name: rule for name, rule in rules.get('rules', {}).items() if rule.get('enabled', True)}
+    compile_rules(parsing_rules, patterns)
+
+    family_anchor_names = {
+        family: tuple(dict.fromkeys(name for keywords in entries if keywords for name in keywords))
+        for family, entries in pattern_anchors.items()
+    }
+
+    for table, value in [(PATTERNS, patterns), (ANCHORS, anchors), (PATTERN_ANCHORS, pattern_anchors),
+                         (FAMILY_ANCHOR_NAMES, family_anchor_names), (FAMILY_KEYWORDS, family_keywords),
+                         (PARSING_RULES, parsing_rules)]:
+        table.clear()
+        table.update(value)
+    VALUE_REMOVAL[:] = value_removal
+    GLOBAL_ANCHOR_NAMES = tuple(dict.fromkeys(
+        name for family in ('manufacturer', 'brand', 'country') for name in family_anchor_names.get(family, ())
+    ))
+    removal_patterns_for.cache_clear()
+    RULES_FILE = path
+
+load_rules()
+
 def extract_technical_specs(text, main_description):
     """
     Extract technical specifications while properly handling various indicators
@@ -205,12 +517,12 @@ def extract_technical_specs(text, main_description):
     # Extract and remove cleanup items
     for rule_type, rule in PARSING_RULES.items():
         if rule.get('cleanup', False):
-            matches = re.finditer(rule['pattern'], specs, re.IGNORECASE)
+            matches = PATTERNS[f'rule_{rule_type}'].finditer(specs)
             for match in matches:
                 specs = specs.replace(match.group(0), '')
     
     # Clean up the remaining text
-    specs = re.sub(r'\s+', ' ', specs)
+    specs = PATTERNS['whitespace'].sub(' ', specs)
     specs = specs.strip(' .,;')
     
     return specs if specs.strip() else None
@@ -221,27 +533,15 @@ def smart_split_products(text):
     """
     # First, extract the main product description
     # Usually everything before the first technical parameter
-    desc_end_indicators = [
-        r'чиста\s+вага',
-        r'lot\.',
-        r'арт\.',
-        r'виготовлен',
-        r'врожаю',
-        r'термін',
-        r'торговельна\s+марка'
-    ]
-    
-    desc_pattern = f"^(.*?)(?={'|'.join(desc_end_indicators)})"
-    desc_match = re.search(desc_pattern, text, re.IGNORECASE | re.DOTALL)
+    desc_match = PATTERNS['desc_end_indicators'].search(text)
     main_description = desc_match.group(1).strip() if desc_match else text
 
     # Extract lot numbers which might indicate separate products
-    lot_pattern = PARSING_RULES['lot_numbers']['pattern']
-    lot_match = re.search(lot_pattern, text, re.IGNORECASE)
+    lot_match = PATTERNS['rule_lot_numbers'].search(text)
     
     products = []
     if lot_match:
-        lot_numbers = re.split(PARSING_RULES['lot_numbers']['split_pattern'], lot_match.group(1))
+        lot_numbers = PATTERNS['rule_lot_numbers_split'].split(lot_match.group(1))
         # Create a product entry for each lot number
         for lot in lot_numbers:
             products.append({
@@ -277,47 +577,23 @@ def extract_global_attributes(row):
     """
     Extract global attributes (manufacturer, brand, country) that apply to all products in the row.
     """
-    # Expanded manufacturer patterns
-    manufacturer_patterns = [
-        r"(Виробник|Manufacturer|Made by)\s*-?\s*(.*?)(?=(?:Країна|Торг|$))",  # Modified to look ahead
-        r"Виробник\s*:\s*(.*?)(?=(?:Країна|Торг|$))",
-        r"(?:Виготовлено|Вир\.)\s*:?\s*-?\s*(.*?)(?=(?:Країна|Торг|$))"
-    ]
-    
+    # Locate the manufacturer, brand and country anchors in a single pass over the row
+    anchors = scan_anchors(row, GLOBAL_ANCHOR_NAMES)
+
     manufacturer = "Unknown"
-    for pattern in manufacturer_patterns:
-        match = re.search(pattern, row, flags=re.IGNORECASE)
-        if match:
-            manufacturer = match.group(2).strip() if len(match.groups()) > 1 else match.group(1).strip()
-            break
+    match = first_match('manufacturer', row, anchors)
+    if match:
+        manufacturer = match.group(2).strip() if len(match.groups()) > 1 else match.group(1).strip()
 
-    # Expanded brand patterns
-    brand_patterns = [
-        r"(?:Торговельна марка|Brand|Торг\. марка|Марка)\s*:?\s*-?\s*(.*?)(?=(?:Країна|Виробник|$))",  # Modified
-        r"(?:під\s+)?(?:торговою\s+)?маркою\s+['\"]?(.*?)['\"]?(?=(?:Країна|Виробник|$))",
-        r"TM\s*['\"]?(.*?)['\"]?(?=(?:Країна|Виробник|$))"
-    ]
-    
     brand = "Unknown"
-    for pattern in brand_patterns:
-        match = re.search(pattern, row, flags=re.IGNORECASE)
-        if match:
-            brand = match.group(1).strip()
-            break
+    match = first_match('brand', row, anchors)
+    if match:
+        brand = match.group(1).strip()
 
-    # Expanded country patterns
-    country_patterns = [
-        r"(?:Країна виробництва|Country of Origin|Made in)\s*:?\s*-?\s*([A-Z]{2}|[A-Za-zА-Яа-я]+)(?=\s|$)",
-        r"(?:Виготовлено в|Вироблено в)\s*([A-Za-zА-Яа-я]+)(?=\s|$)",
-        r"Країна походження\s*:?\s*([A-Za-zА-Яа-я]+)(?=\s|$)"
-    ]
-    
     country = "Unknown"
-    for pattern in country_patterns:
-        match = re.search(pattern, row, flags=re.IGNORECASE)
-        if match:
-            country = match.group(1).strip()
-            break
+    match = first_match('country', row, anchors)
+    if match:
+        country = match.group(1).strip()
 
     # Clean up the values
     manufacturer = manufacturer.strip(' .,;:-')
@@ -331,9 +607,11 @@ def extract_global_attributes(row):
     }
 
 
-def split_products(row):
+def split_products(row, product_patterns=None):
     """
-    Universal splitting logic for products with smart pattern recognition
+    Universal splitting logic for products with smart pattern recognition.
+    product_patterns narrows PATTERNS['product'] down to the patterns that
+    were already found to match somewhere in the row.
     """
     if not row or not isinstance(row, str):
         return "", []
@@ -352,7 +630,7 @@ def split_products(row):
         for product_text in product_parts:
             if product_text:
                 # Ensure the product has a quantity indicator
-                if re.search(r'\d+\s*(?:шт|pcs|кор|boxes|packs|мішків|kg|кг)', product_text):
+                if PATTERNS['has_quantity'].search(product_text):
                     products.append(product_text)
         
         # If no products found, use the whole text after ':'
@@ -365,31 +643,20 @@ def split_products(row):
     # First, extract the main description using the new method
     main_description = extract_main_description(row)
 
-    # Product splitting patterns
-    product_patterns = [
-        # Pattern with quantity at the end
-        r'(?:[A-ZА-ЯІЇЄ][^-\n]*?)\s*-\s*(\d+)\s*(?:шт|pcs|кор|boxes|packs|мішків|kg|кг)',
-        
-        # Pattern with article number and quantity
-        r'(?:арт\.|артикул|код)\s*[:.]?\s*[A-Z0-9\-]+[^,]*?(\d+)\s*(?:шт|pcs|кор|boxes|packs)',
-        
-        # Pattern with quantity in parentheses
-        r'[A-ZА-ЯІЇЄ][^(]*?\((\d+)\s*(?:шт|pcs|кор|boxes|packs|мішків|kg|кг)\)'
-    ]
-    
     products = []
     remaining_text = row
 
     # Find all product matches
-    for pattern in product_patterns:
-        matches = list(re.finditer(pattern, remaining_text, re.IGNORECASE))
+    for pattern in PATTERNS['product'] if product_patterns is None else product_patterns:
+        check_budget()
+        matches = list(pattern.finditer(remaining_text))
         
         if matches:
             for match in matches:
                 product_text = match.group(0).strip()
                 
                 # Clean up the product text
-                product_text = re.sub(r'\s+', ' ', product_text)
+                product_text = PATTERNS['whitespace'].sub(' ', product_text)
                 product_text = product_text.strip('.,;')
                 
                 products.append(product_text)
@@ -397,8 +664,8 @@ def split_products(row):
     # If no products found using patterns, try alternative splitting
     if not products:
         # Look for quantity indicators
-        quantity_splits = re.split(r'(?<=\d)\s*(?:шт|pcs|кор|boxes|packs|мішків|kg|кг)[,;\s]*', row)
-        products = [split.strip() for split in quantity_splits if re.search(r'\d+', split)]
+        quantity_splits = PATTERNS['quantity_split'].split(row)
+        products = [split.strip() for split in quantity_splits if PATTERNS['has_digit'].search(split)]
 
     # If still no products, use the whole row
     if not products:
@@ -407,13 +674,14 @@ def split_products(row):
     # Clean up products
     cleaned_products = []
     for product in products:
+        check_budget()
         # Remove global attribute information
-        product = re.sub(r'Торговельна марка.*?(?=(?:Виробник|Країна|$))', '', product, flags=re.IGNORECASE)
-        product = re.sub(r'Виробник.*?(?=(?:Країна|$))', '', product, flags=re.IGNORECASE)
-        product = re.sub(r'Країна виробництва.*?$', '', product, flags=re.IGNORECASE)
+        product = PATTERNS['strip_brand'].sub('', product)
+        product = PATTERNS['strip_manufacturer'].sub('', product)
+        product = PATTERNS['strip_country'].sub('', product)
         
         # Ensure the product has both name and quantity
-        if re.search(r'\d+\s*(?:шт|pcs|кор|boxes|packs|мішків|kg|кг)', product):
+        if PATTERNS['has_quantity'].search(product):
             cleaned_products.append(product.strip())
 
     return main_description, cleaned_products
@@ -421,157 +689,92 @@ def split_products(row):
 
 def parse_individual_product(product_section, product_description):
     """
-    Enhanced parser with smart value extraction
+    Enhanced parser with smart value extraction.
+    Extractors record the (start, end) span of what they match in the
+    section instead of cutting it out; later extractors pass over text
+    already taken, and the technical specs are what is left once every span
+    is cut out, in one pass at the end.
     """
-    # Extract contextual values
-    extracted_values = extract_contextual_values(product_section)
-    
-    # Use extracted values
-    model_article = extracted_values.get('article_number', 'Unknown')
-    weight = extracted_values.get('weight')
-    quantity = extracted_values.get('quantity')
-    
-    # Rest of the function remains the same...
-    remaining_text = product_section
-    
-    # Remove extracted values from remaining text
-    remaining_text = clean_description_from_extracted_values(remaining_text, extracted_values)
-       
-    # Use these values to help determine what's what
-    if 'article_numbers' in extracted_values:
-        model_article = extracted_values['article_numbers']
-    else:
-        model_article = "Unknown"
-    
-    remaining_text = product_section
-    # Remove the extracted values from remaining text
-    for value in extracted_values.values():
-        remaining_text = remaining_text.replace(value, '')
+    text = product_section
+    # Spans of the fields found so far, which later fields can't reuse
+    spans = []
+
+    # Contextual values (keyword and value) stay out of the specs, and out
+    # of every field but their own: a "вага 2 кг" is no quantity
+    contextual = {category: match.span() for category, (value, match) in contextual_matches(text).items()}
+    def spans_but(category):
+        if not contextual:
+            return spans
+        return spans + [span for other, span in contextual.items() if other != category]
 
     # First, try to identify the quantity and product name structure
-    quantity_match = re.search(r'(.*?)\s*-\s*(\d+)\s*(шт|pcs|кор|boxes|packs|мішків|kg|кг)', product_section)
-    if quantity_match:
-        product_name = quantity_match.group(1).strip()
-        quantity = int(quantity_match.group(2))
-        remaining_text = remaining_text.replace(quantity_match.group(0), '').strip()
+    quantity = None
+    match = PATTERNS['name_dash_quantity'].search(text)
+    if match:
+        quantity = int(match.group(2))
     else:
         # Try alternative quantity patterns
-        quantity_patterns = [
-            r'(\d+)\s*(шт|pcs|кор|boxes|packs|мішків|kg|кг)',
-            r'кількість\s*[:.]?\s*(\d+)',
-            r'(\d+)\s*(?:одиниць|pieces)',
-            r'x\s*(\d+)(?:\s|$)',
-            r'(\d+)\s*(?:штук|единиц|items)'
-        ]
-        
-        quantity = None
-        for pattern in quantity_patterns:
-            match = re.search(pattern, remaining_text, flags=re.IGNORECASE)
-            if match:
-                quantity = int(match.group(1))
-                remaining_text = remaining_text.replace(match.group(0), '').strip()
-                break
-
-    # Define base patterns
-    model_patterns = [
-        r"(Номер\s?(CAS|CAT):?\s?[\w\.\-/\\]+)",
-        r"(арт\.:?\s?[\w\.\-/\\]+)",
-        r"(артикул:?\s?[\w\.\-/\\]+)",
-        r"(код:?\s?[\w\.\-/\\]+)",
-        r"(№\s*[\w\.\-/\\]+)",
-        r"([A-Z0-9][\w\-/\\]*\d+[\w\-/\\]*)",
-        r"(\d{4,}(?:-[\w\-/\\]+)?)",
-        r"((?:мод\.|модель)\s*[\w\.\-/\\]+)"
-    ]
-    
+        match = first_match('quantity', text, spans=spans_but('quantity'))
+        if match:
+            quantity = int(match.group(1))
+    if match:
+        spans.append(match.span())
+
     # Process model/article
     model_article = "Unknown"
-    for pattern in model_patterns:
-        match = re.search(pattern, remaining_text, flags=re.IGNORECASE)
-        if match:
-            model_article = match.group(1).strip()
-            remaining_text = remaining_text.replace(match.group(0), "").strip()
-            break
+    match = first_match('model', text, spans=spans_but('article_number'))
+    if match:
+        model_article = match.group(1).strip()
+        spans.append(match.span())
 
     # Process weight
-    weight_patterns = [
-        r"(\d+(?:\.\d+)?)\s?(кг|kg|г|гр|g|мг|mg)",
-        r"вага\s*[:.]?\s*(\d+(?:\.\d+)?)\s*(кг|kg|г|гр|g)",
-        r"(\d+(?:\.\d+)?)\s*(тонн|tons|т)"
-    ]
-    
     weight = None
-    for pattern in weight_patterns:
-        match = re.search(pattern, remaining_text, flags=re.IGNORECASE)
-        if match:
-            weight = f"{match.group(1)} {match.group(2)}"
-            remaining_text = remaining_text.replace(match.group(0), "").strip()
-            break
+    match = first_match('weight', text, spans=spans_but('weight'))
+    if match:
+        weight = f"{match.group(1)} {match.group(2)}"
+        spans.append(match.span())
 
     # Process packaging
-    packaging_patterns = [
-        r"(\d+\s?мішків|\d+\s?кор|boxes|packs|упак)",
-        r"(\d+)\s*(коробок|упаковок|пакетів)",
-        r"в\s*упаковці\s*(\d+)\s*(шт|pcs)"
-    ]
     packaging = None
-    for pattern in packaging_patterns:
-        match = re.search(pattern, remaining_text, flags=re.IGNORECASE)
-        if match:
-            packaging = match.group(0).strip()
-            remaining_text = remaining_text.replace(match.group(0), "").strip()
-            break
+    match = None
+    if scan_families(text, ('packaging',)):
+        match = first_match('packaging', text, spans=spans_but(None))
+    if match:
+        packaging = match.group(0).strip()
+        spans.append(match.span())
 
     # Process chemical formula
-    chemical_formula_patterns = [
-        r"(?:[^\s]*?Хімічна формула|Хім\. формула|Формула|Хим\. формула|Формула хім\.|Формула речовини|Chemical Formula|Chem\. Formula|C\. Formula|Ф\. хім\.)\s*-?\s*([\w\*\.\d]+)",
-        r"Chemical composition:\s*([\w\*\.\d]+)",
-        r"Formula:\s*([\w\*\.\d]+)"
-    ]
-    
     chemical_formula = None
-    for pattern in chemical_formula_patterns:
-        match = re.search(pattern, remaining_text, flags=re.IGNORECASE)
-        if match:
-            chemical_formula = match.group(1).strip()
-            remaining_text = remaining_text.replace(match.group(0), "").strip()
-            break
+    match = first_match('chemical_formula', text, spans=spans_but(None))
+    if match:
+        chemical_formula = match.group(1).strip()
+        spans.append(match.span())
 
     # Initialize manufacturer, brand, and country (will be filled by global attributes later)
     manufacturer = None
     brand = None
     country = None
 
-    # Process technical specs
-    if technical_specs := remaining_text.strip():
-        # Remove product description content
-        technical_specs = technical_specs.replace(product_description, '')
-        
-        # Remove all previously extracted information
-        if model_article and model_article != "Unknown":
-            technical_specs = technical_specs.replace(model_article, '')
+    # Process technical specs: what is left once the fields, the contextual
+    # values and the product description are cut out
+    taken = spans_but(None)
+    if product_description and (start := text.find(product_description)) >= 0:
+        taken.append((start, start + len(product_description)))
+    technical_specs = cut_spans(text, taken)
+
+    if technical_specs.strip():
+        # Remove leftover keywords and quantities that weren't extracted
         if quantity:
-            technical_specs = re.sub(r'\d+\s*(шт|pcs|кор|boxes|packs|мішків|kg|кг)', '', technical_specs)
-        if weight:
-            technical_specs = technical_specs.replace(weight, '')
-        if packaging:
-            technical_specs = technical_specs.replace(packaging, '')
-        if chemical_formula:
-            technical_specs = technical_specs.replace(chemical_formula, '')
-            
+            technical_specs = PATTERNS['specs_quantity'].sub('', technical_specs)
+        technical_specs = PATTERNS['specs_article'].sub('', technical_specs)
+        technical_specs = PATTERNS['specs_quantity_keyword'].sub('', technical_specs)
+        technical_specs = PATTERNS['specs_weight_keyword'].sub('', technical_specs)
+        technical_specs = PATTERNS['specs_multiplier'].sub('', technical_specs)
+
         # Clean up any remaining artifacts
-        technical_specs = re.sub(r'\s+', ' ', technical_specs)  # Replace multiple spaces with single space
-        technical_specs = re.sub(r'[,;.]\s*[,;.]', '.', technical_specs)  # Clean up multiple punctuation
-        technical_specs = technical_specs.strip(' .,;')  # Remove leading/trailing punctuation and spaces
-        
-        # Additional cleaning patterns
-        technical_specs = re.sub(r'(?:арт\.|артикул|код|model|модель)[\s:.]*[\w\-/\\]+', '', technical_specs, flags=re.IGNORECASE)
-        technical_specs = re.sub(r'(?:к-ть|кількість|qty|quantity)\s*[-:=]?\s*\d+', '', technical_specs, flags=re.IGNORECASE)
-        technical_specs = re.sub(r'(?:вес|вага|weight)\s*[-:=]?\s*\d+(?:\.\d+)?\s*(?:кг|kg|г|гр|g|мг|mg)', '', technical_specs, flags=re.IGNORECASE)
-        technical_specs = re.sub(r'x\s*\d+(?:\s|$)', '', technical_specs)
-        
-        # If after cleaning nothing meaningful remains, set to None
-        technical_specs = technical_specs if technical_specs.strip() else None
+        technical_specs = PATTERNS['whitespace'].sub(' ', technical_specs)  # Replace multiple spaces with single space
+        technical_specs = PATTERNS['specs_punctuation'].sub('.', technical_specs)  # Clean up multiple punctuation
+    technical_specs = technical_specs.strip(' .,;') or None
 
     return {
         "Product_Description": product_description,
@@ -589,18 +792,22 @@ def parse_individual_product(product_section, product_description):
 
 
 
-def parse_row(row):
+def parse_row(row, global_attributes=None, product_patterns=None):
     """
     Parse a row with multiple products and ensure global attributes are applied to all products.
+    global_attributes can be passed in when they were already extracted for the row,
+    product_patterns is handed on to split_products.
     """
     # Extract global attributes first
-    global_attributes = extract_global_attributes(row)
+    if global_attributes is None:
+        global_attributes = extract_global_attributes(row)
     
     # Get main description and product sections
-    main_description, product_sections = split_products(row)
+    main_description, product_sections = split_products(row, product_patterns)
     
     products = []
     for section in product_sections:
+        check_budget()
         product_data = parse_individual_product(section, main_description)
         
         # Apply global attributes
@@ -629,67 +836,1271 @@ def parse_row(row):
     return products
 
 
-# Read the CSV file
-# Replace the reading and processing part with this:
+# Seconds a row may take before it is sent to the fallback parse
+ROW_TIME_BUDGET = 1.0
 
-try:
-    print("Starting to read file...")
+# Seconds a product pattern takes to fail on a row, per squared character
+# of the row: the lazy patterns slow down quadratically with row length
+PATTERN_SECONDS_PER_CHAR2 = 2e-8
+
+
+def row_chars_for_budget(time_budget):
+    """
+    The longest row a single product pattern call still gets through in
+    half of time_budget. The budget is only checked between pattern calls,
+    so longer rows go straight to the fallback parse instead.
+    """
+    return int((time_budget / 2 / PATTERN_SECONDS_PER_CHAR2) ** 0.5)
+
+
+# Rows longer than this go straight to the fallback parse
+MAX_ROW_CHARS = row_chars_for_budget(ROW_TIME_BUDGET)
+
+# Description length kept by the fallback parse when no end indicator is found
+FALLBACK_DESCRIPTION_CHARS = 200
+
+
+def fallback_parse_row(row, reason, global_attributes=None):
+    """
+    Cheap parse for rows the full parser gave up on: global attributes and
+    the text before the first end indicator as description, flagged with
+    the reason for the fallback
+    """
+    if global_attributes is None:
+        global_attributes = extract_global_attributes(row)
     
-    # Read the file line by line
-    with open('D:/outputonly.csv', 'r', encoding='utf-8') as file:
-        lines = file.readlines()
+    match = PATTERNS['end_indicators'].search(row)
+    description = row[:match.start()] if match else row[:FALLBACK_DESCRIPTION_CHARS]
+    description = PATTERNS['whitespace'].sub(' ', description).strip('.,; ')
     
-    print(f"Successfully loaded {len(lines)} lines from file.")
+    return [{
+        "Product_Description": description,
+        "Model_Article": "Unknown",
+        "Quantity": None,
+        "Weight": None,
+        "Packaging": None,
+        "Technical_Specs": None,
+        "Chemical_Formula": None,
+        "Brand": global_attributes["Brand"],
+        "Manufacturer": global_attributes["Manufacturer"],
+        "Country": global_attributes["Country"],
+        "Fallback_Reason": reason
+    }]
+
+
+def parse_row_with_budget(row, time_budget=ROW_TIME_BUDGET, max_row_chars=MAX_ROW_CHARS,
+                          global_attributes=None, product_patterns=None):
+    """
+    Parse a row, falling back to fallback_parse_row when it is longer than
+    max_row_chars or parsing it takes more than time_budget seconds.
+    Either limit can be switched off with 0/None.
+    Returns (products, fallback reason or None).
+    """
+    global ROW_DEADLINE
+    if max_row_chars and len(row) > max_row_chars:
+        return fallback_parse_row(row, 'row_length', global_attributes), 'row_length'
     
-except Exception as e:
-    print(f"Error reading file: {e}")
-    print("Current working directory:", os.getcwd())
-    exit()
+    if time_budget:
+        ROW_DEADLINE = time.perf_counter() + time_budget
+    try:
+        return parse_row(row, global_attributes, product_patterns), None
+    except RowTimeout:
+        pass
+    finally:
+        ROW_DEADLINE = None
+    return fallback_parse_row(row, 'time_budget', global_attributes), 'time_budget'
+
+
+# Number of distinct rows whose parse results are kept in memory
+CACHE_SIZE = 50000
+
+# Pending SQLite writes are committed after this many new rows
+CACHE_COMMIT_EVERY = 1000
+
+
+def parser_fingerprint():
+    """
+    Hash of this file's source and of the loaded rule file, so a persisted
+    cache is dropped whenever the parser or its rules change
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for path in (__file__, RULES_FILE):
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+class ParseCache:
+    """
+    Bounded LRU cache of parse results keyed by a hash of the row text.
+    With a path, results are also persisted to SQLite, so rows parsed in
+    earlier runs are not parsed again.
+    Rows that raised or got the fallback parse are never cached: whether a
+    row falls back depends on the limits of the run, not only on the row.
+    """
+    def __init__(self, max_size=CACHE_SIZE, path=None):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.db = None
+        self.unsaved = 0
+        if path:
+            self.open_db(path)
+
+    def open_db(self, path):
+        self.db = sqlite3.connect(path)
+        self.db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS parsed_rows (hash TEXT PRIMARY KEY, result TEXT)")
+        fingerprint = parser_fingerprint()
+        row = self.db.execute("SELECT value FROM meta WHERE key = 'parser'").fetchone()
+        if row is None or row[0] != fingerprint:
+            # Results from another version of the parser can't be trusted
+            self.db.execute("DELETE FROM parsed_rows")
+            self.db.execute("INSERT OR REPLACE INTO meta VALUES ('parser', ?)", (fingerprint,))
+        self.db.commit()
+
+    @staticmethod
+    def key(row):
+        # Rows are already stripped; anything further (case, inner
+        # whitespace) can change what the patterns extract
+        return hashlib.blake2b(row.encode('utf-8'), digest_size=16).hexdigest()
 
-# Parse all lines
-parsed_data = []
-total_lines = len(lines)
+    def get(self, row):
+        """
+        Return the cached (products, fallback reason) of a row, or None
+        """
+        key = self.key(row)
+        result = self.entries.get(key)
+        if result is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+        elif self.db is not None:
+            stored = self.db.execute("SELECT result FROM parsed_rows WHERE hash = ?", (key,)).fetchone()
+            if stored:
+                result = tuple(json.loads(stored[0]))
+                self.remember(key, result)
+                self.disk_hits += 1
+        if result is None:
+            self.misses += 1
+            return None
+        products, fallback = result
+        # Callers get their own dicts
+        return [dict(product) for product in products], fallback
 
-print(f"\nStarting to process {total_lines} lines...")
+    def put(self, row, products, fallback):
+        if fallback is not None:
+            return
+        key = self.key(row)
+        result = ([dict(product) for product in products], fallback)
+        self.remember(key, result)
+        if self.db is not None:
+            self.db.execute("INSERT OR REPLACE INTO parsed_rows VALUES (?, ?)",
+                            (key, json.dumps(result, ensure_ascii=False)))
+            self.unsaved += 1
+            if self.unsaved >= CACHE_COMMIT_EVERY:
+                self.db.commit()
+                self.unsaved = 0
 
-for index, line in enumerate(lines):
-    print(f"\nProcessing line {index + 1}/{total_lines}")
+    def remember(self, key, result):
+        self.entries[key] = result
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else None
+        }
+
+    def close(self):
+        if self.db is not None:
+            self.db.commit()
+            self.db.close()
+            self.db = None
+
+
+def parse_row_cached(row, cache, time_budget=ROW_TIME_BUDGET, max_row_chars=MAX_ROW_CHARS):
+    """
+    parse_row_with_budget behind an optional ParseCache
+    """
+    if cache is None:
+        return parse_row_with_budget(row, time_budget, max_row_chars)
+    result = cache.get(row)
+    if result is None:
+        result = parse_row_with_budget(row, time_budget, max_row_chars)
+        cache.put(row, *result)
+    return result
+
+
+# Vectorized engine: the same patterns run over a whole column of rows with
+# the pandas str accessor. The column is kept as object dtype so the
+# patterns go through the re module exactly like in the per-row code.
+
+def column_pattern(pattern):
+    """
+    The compiled pattern behind a PATTERNS entry. The str accessor only
+    takes strings and re patterns, not the TimedPattern wrappers installed
+    by enable_profiling; the column stages are timed as a whole instead.
+    """
+    return pattern.pattern if isinstance(pattern, TimedPattern) else pattern
+
+
+def anchor_columns(rows):
+    """
+    Lowercased rows, and a mask of the rows whose anchor offsets
+    scan_anchors wouldn't trust
+    """
+    lowered = rows.str.lower()
+    unsafe = (lowered.str.len() != rows.str.len()) | rows.str.contains(CASE_FOLD_VARIANTS)
+    return lowered, unsafe
+
+
+def extract_first_column(rows, family, lowered, unsafe):
+    """
+    Column-wise first_match: the last group of the first pattern in a family
+    that matches each row, None where no pattern matches.
+    Anchored patterns only run on the rows that contain one of their keywords.
+    """
+    result = pd.Series(None, index=rows.index, dtype=object)
+    pattern_anchors = PATTERN_ANCHORS.get(family) or [None] * len(PATTERNS[family])
+    for pattern, keywords in zip(map(column_pattern, PATTERNS[family]), pattern_anchors):
+        # The groups of these families always take part in a match,
+        # so a missing value means the row is still unmatched
+        todo = result.isna()
+        if keywords is not None:
+            present = unsafe.copy()
+            for name in keywords:
+                present |= lowered.str.contains(ANCHORS[name], regex=False)
+            todo &= present
+        if todo.any():
+            result[todo] = rows[todo].str.extract(pattern, expand=True).iloc[:, -1]
+    return result
+
+
+def extract_global_attributes_column(rows):
+    """
+    Column-wise extract_global_attributes: a DataFrame with the Manufacturer,
+    Brand and Country of every row
+    """
+    lowered, unsafe = anchor_columns(rows)
+    columns = {}
+    for column, family in (("Manufacturer", 'manufacturer'), ("Brand", 'brand'), ("Country", 'country')):
+        values = extract_first_column(rows, family, lowered, unsafe)
+        columns[column] = values.str.strip().str.strip(' .,;:-').fillna("Unknown")
+    return pd.DataFrame(columns, index=rows.index)
+
+
+def extract_contextual_values_column(rows):
+    """
+    Column-wise extract_contextual_values: a DataFrame with the article_number,
+    weight and quantity of every row, None where a value wasn't found
+    """
+    columns = {}
+    for category, family in CONTEXTUAL_FAMILIES.items():
+        values = pd.Series(None, index=rows.index, dtype=object)
+        for pattern in map(column_pattern, PATTERNS[family]):
+            # Every pattern is tried and the last match wins,
+            # like in extract_contextual_values
+            matched = rows.str.extract(pattern, expand=True)[0].str.strip()
+            values = matched.where(matched.notna(), values)
+        columns[category] = values
+
+    # The captured groups always pass the number checks of the per-row
+    # code, only the article number has a separate validity pattern
+    article = columns['article_number']
+    valid = article.str.match(column_pattern(PATTERNS['valid_article_number']), na=False)
+    columns['article_number'] = article.where(valid)
+    columns['weight'] = columns['weight'] + " кг"
+    # Built as a list, a mapped column would turn into floats around the gaps
+    columns['quantity'] = pd.Series([None if pd.isna(value) else int(value) for value in columns['quantity']],
+                                    index=rows.index, dtype=object)
+    return pd.DataFrame(columns, index=rows.index).astype(object)
+
+
+def extract_main_description_column(rows):
+    """
+    Column-wise extract_main_description
+    """
+    contextual = extract_contextual_values_column(rows)
+
+    # Text before the first end indicator, or else the first sentence
+    end_indicators = column_pattern(PATTERNS['end_indicators'])
+    has_indicator = rows.str.contains(end_indicators)
+    before_indicator = rows.str.split(end_indicators, n=1).str[0]
+    first_sentence = rows.str.split(column_pattern(PATTERNS['sentence_end']), n=1).str[0]
+    main_desc = before_indicator.where(has_indicator, first_sentence).str.strip()
+
+    # The removal patterns depend on the extracted values, so this step is per row
+    main_desc = pd.Series([
+        clean_description_from_extracted_values(
+            description,
+            {category: value for category, value in values.items() if not pd.isna(value)}
+        )
+        for description, values in zip(main_desc, contextual.to_dict('records'))
+    ], index=rows.index, dtype=object)
+
+    # Final cleanup
+    main_desc = main_desc.str.replace(column_pattern(PATTERNS['leading_numbering']), '', regex=True)
+    main_desc = main_desc.str.replace(column_pattern(PATTERNS['whitespace']), ' ', regex=True)
+    return main_desc.str.strip('.,; ')
+
+
+# Inline flags for the re flags RE2 understands the same way
+RE2_FLAGS = {re.IGNORECASE: 'i', re.MULTILINE: 'm', re.DOTALL: 's'}
+
+# Characters RE2 treats differently from the re module: \s and \d are
+# ASCII-only in RE2, but also match other whitespace and digits in re
+RE2_DIVERGENT = re.compile(r'[^\S\t\n\f\r ]|[^\D0-9]')
+
+# Escapes that are ASCII-only in RE2 whatever the row holds: a word
+# character or word boundary in Cyrillic text never matches there
+RE2_ASCII_ESCAPES = re.compile(r'(?<!\\)(?:\\\\)*\\[wWbB]')
+
+
+def re2_pattern(pattern):
+    """
+    The source of a compiled pattern with its flags inlined for RE2,
+    None when it uses a flag or escape RE2 has no equivalent for
+    """
+    if RE2_ASCII_ESCAPES.search(pattern.pattern):
+        return None
+    flags = pattern.flags & ~re.UNICODE
+    inline = ''
+    for flag, letter in RE2_FLAGS.items():
+        if flags & flag:
+            inline += letter
+            flags &= ~flag
+    if flags:
+        return None
+    return f'(?{inline}){pattern.pattern}' if inline else pattern.pattern
+
+
+def product_patterns_column(rows):
+    """
+    For every row, the PATTERNS['product'] entries that match it somewhere,
+    found column-wise by Arrow's RE2 engine. RE2 runs in linear time, while
+    the lazy product patterns take quadratic time to fail on a row, which
+    is where split_products spends most of its time.
+    A pattern RE2 can't run, and the rows RE2 might judge differently from
+    the re module, keep every pattern. Returns None without pyarrow.
+    """
     try:
-        # Clean the line
-        text = line.strip()
-        
-        # Skip empty lines
-        if not text:
-            print("Skipping empty line")
+        import pyarrow as pa
+        import pyarrow.compute as pc
+    except ImportError:
+        return None
+
+    _, unsafe = anchor_columns(rows)
+    unsafe = (unsafe | rows.str.contains(RE2_DIVERGENT)).tolist()
+    array = pa.array(rows.tolist(), pa.large_string())
+    masks = []
+    for pattern in PATTERNS['product']:
+        source = re2_pattern(column_pattern(pattern))
+        matched = [True] * len(rows)
+        if source is not None:
+            try:
+                matched = pc.match_substring_regex(array, source).to_pylist()
+            except pa.ArrowInvalid:
+                pass
+        masks.append(matched)
+
+    return pd.Series([
+        [pattern for pattern, matched in zip(PATTERNS['product'], row_masks) if matched or row_unsafe]
+        for row_unsafe, *row_masks in zip(unsafe, *masks)
+    ], index=rows.index, dtype=object)
+
+
+def parse_chunk_vectorized(texts, time_budget=ROW_TIME_BUDGET, max_row_chars=MAX_ROW_CHARS):
+    """
+    Parse a list of rows with the vectorized engine, returning
+    (products, fallback reason, seconds, error message) for every row.
+    Global attributes are extracted column-wise for every row. Rows without
+    a ':' and without any quantity never yield product sections, so their
+    single product is built column-wise too; the other rows go through the
+    per-row parser with the attributes already filled in, and with only
+    the product patterns that RE2 found to match.
+    """
+    start = time.perf_counter()
+    rows = pd.Series(texts, dtype=object)
+    lengths = rows.str.len()
+    short = lengths <= max_row_chars if max_row_chars else lengths >= 0
+    no_colon = ~rows.str.contains(':', regex=False)
+    has_quantity = rows.str.contains(column_pattern(PATTERNS['has_quantity']))
+    simple = short & no_colon & ~has_quantity
+
+    attributes = extract_global_attributes_column(rows[short]).to_dict('index')
+    descriptions = extract_main_description_column(rows[simple]).to_dict()
+    # Only rows without a ':' get as far as the product patterns
+    product_patterns = product_patterns_column(rows[short & no_colon & has_quantity])
+    product_patterns = {} if product_patterns is None else product_patterns.to_dict()
+    # The column-wise work is shared evenly between the rows it covered
+    seconds = (time.perf_counter() - start) / max(1, short.sum())
+
+    results = []
+    for index, text in enumerate(texts):
+        global_attributes = attributes.get(index)
+        if index in descriptions:
+            products = []
+            if descriptions[index]:
+                products.append({
+                    "Product_Description": descriptions[index],
+                    "Model_Article": "Unknown",
+                    "Quantity": None,
+                    "Weight": None,
+                    "Packaging": None,
+                    "Technical_Specs": None,
+                    "Chemical_Formula": None,
+                    **global_attributes
+                })
+            results.append((products, None, seconds, None))
             continue
-            
-        print(f"Text length: {len(text)}")
-        print(f"First 100 characters: {text[:100]}...")
+
+        row_start = time.perf_counter()
+        try:
+            parsed_products, fallback = parse_row_with_budget(text, time_budget, max_row_chars,
+                                                              global_attributes, product_patterns.get(index))
+            results.append((parsed_products, fallback, time.perf_counter() - row_start + seconds, None))
+        except Exception as e:
+            results.append((None, None, time.perf_counter() - row_start + seconds, str(e)))
+    return results
+
+
+class StageProfiler:
+    """
+    Cumulative time and call counts per parser stage and per named pattern.
+    Stage times are inclusive, e.g. split_products includes the time spent
+    in extract_main_description.
+    """
+    def __init__(self):
+        self.stages = defaultdict(lambda: [0, 0.0])
+        self.patterns = defaultdict(lambda: [0, 0.0])
+
+    def record(self, table, name, seconds):
+        entry = table[name]
+        entry[0] += 1
+        entry[1] += seconds
+
+    def snapshot(self, reset=False):
+        data = {
+            "stages": {name: list(entry) for name, entry in self.stages.items()},
+            "patterns": {name: list(entry) for name, entry in self.patterns.items()}
+        }
+        if reset:
+            self.stages.clear()
+            self.patterns.clear()
+        return data
+
+    def merge(self, data):
+        """
+        Add a snapshot taken in another process
+        """
+        for kind in ("stages", "patterns"):
+            table = getattr(self, kind)
+            for name, (calls, seconds) in data[kind].items():
+                table[name][0] += calls
+                table[name][1] += seconds
+
+    def dump(self, path):
+        def as_rows(table):
+            return [
+                {"name": name, "calls": calls, "seconds": round(seconds, 6),
+                 "mean_us": round(1e6 * seconds / calls, 3) if calls else None}
+                for name, (calls, seconds) in sorted(table.items(), key=lambda item: -item[1][1])
+            ]
+
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"stages": as_rows(self.stages), "patterns": as_rows(self.patterns)},
+                      f, ensure_ascii=False, indent=2)
+
+
+class TimedPattern:
+    """
+    Wraps a compiled pattern and records the time spent in each call
+    """
+    def __init__(self, name, pattern, profiler):
+        self.name = name
+        self.pattern = pattern
+        self.profiler = profiler
+
+    def _timed(self, method, *args):
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            self.profiler.record(self.profiler.patterns, self.name, time.perf_counter() - start)
+
+    def search(self, *args):
+        return self._timed(self.pattern.search, *args)
+
+    def match(self, *args):
+        return self._timed(self.pattern.match, *args)
+
+    def sub(self, *args):
+        return self._timed(self.pattern.sub, *args)
+
+    def split(self, *args):
+        return self._timed(self.pattern.split, *args)
+
+    def finditer(self, *args):
+        # Run the whole scan here so its time is attributed to this pattern
+        return iter(self._timed(lambda *a: list(self.pattern.finditer(*a)), *args))
+
+    def __getattr__(self, name):
+        return getattr(self.pattern, name)
+
+
+# Parser stages timed when profiling is enabled
+PROFILED_STAGES = [
+    'parse_row',
+    'extract_global_attributes',
+    'scan_anchors',
+    'scan_families',
+    'split_products',
+    'extract_main_description',
+    'extract_contextual_values',
+    'clean_description_from_extracted_values',
+    'parse_individual_product',
+    'extract_global_attributes_column',
+    'extract_contextual_values_column',
+    'extract_main_description_column',
+    'product_patterns_column'
+]
+
+PROFILER = None
+
+
+def timed_stage(name, func, profiler):
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profiler.record(profiler.stages, name, time.perf_counter() - start)
+    wrapper.__name__ = func.__name__
+    wrapper.__doc__ = func.__doc__
+    return wrapper
+
+
+def enable_profiling():
+    """
+    Turn on per-stage and per-pattern timing for this process.
+    Stage functions and PATTERNS entries are swapped for timed wrappers, so
+    runs without profiling pay nothing for it.
+    """
+    global PROFILER
+    if PROFILER is not None:
+        return PROFILER
+    PROFILER = StageProfiler()
+
+    module_globals = globals()
+    for name in PROFILED_STAGES:
+        module_globals[name] = timed_stage(name, module_globals[name], PROFILER)
+
+    for name, entry in list(PATTERNS.items()):
+        if isinstance(entry, list):
+            PATTERNS[name] = [TimedPattern(f'{name}[{i}]', p, PROFILER) for i, p in enumerate(entry)]
+        else:
+            PATTERNS[name] = TimedPattern(name, entry, PROFILER)
+    return PROFILER
+
+
+# Columns of the output CSV, in order
+OUTPUT_COLUMNS = [
+    "Product_Description",
+    "Model_Article",
+    "Quantity",
+    "Weight",
+    "Packaging",
+    "Technical_Specs",
+    "Chemical_Formula",
+    "Brand",
+    "Manufacturer",
+    "Country",
+    # Set when the row went through fallback_parse_row
+    "Fallback_Reason"
+]
+
+# Output columns with few distinct values, accumulated dictionary-encoded
+CATEGORICAL_COLUMNS = ["Brand", "Manufacturer", "Country", "Fallback_Reason"]
+
+INPUT_FILE = 'D:/outputonly.csv'
+OUTPUT_FILE = 'D:/parsed_products.csv'
+
+# Number of parsed products written to the output per batch
+BATCH_SIZE = 10000
+
+# Number of input lines handed to a worker process at a time in parallel mode
+CHUNK_SIZE = 1000
+
+# Minimum number of seconds between two progress reports
+PROGRESS_INTERVAL = 5.0
+
+
+class ProgressReporter:
+    """
+    Tracks a parsing run: prints rate-limited progress (lines/s, products/s,
+    ETA) and collects end-of-run statistics
+    """
+    def __init__(self, total_bytes=None, interval=PROGRESS_INTERVAL, verbose=False, slowest=10):
+        self.total_bytes = total_bytes
+        self.interval = interval
+        self.verbose = verbose
+        self.slowest_count = slowest
+        self.start_time = time.perf_counter()
+        self.last_report = self.start_time
+        self.bytes_read = 0
+        self.lines = 0
+        self.parsed_lines = 0
+        self.products = 0
+        self.errors = 0
+        self.quarantined = 0
+        self.encoding = None
+        self.fallbacks = Counter()
+        self.products_per_row = Counter()
+        # ParseCache of the run, if any, for its hit/miss counters
+        self.cache = None
+        # Min-heap of (seconds, line number, text preview)
+        self.slowest = []
+
+    def line_read(self, nbytes):
+        self.bytes_read += nbytes
+
+    def line_parsed(self, line_number, product_count, seconds, text, fallback=None):
+        self.lines = line_number
+        self.parsed_lines += 1
+        self.products += product_count
+        self.products_per_row[product_count] += 1
+        if fallback:
+            self.fallbacks[fallback] += 1
+
+        entry = (seconds, line_number, text[:100])
+        if len(self.slowest) < self.slowest_count:
+            heapq.heappush(self.slowest, entry)
+        elif entry > self.slowest[0]:
+            heapq.heapreplace(self.slowest, entry)
+
+        if self.verbose:
+            print(f"Found {product_count} products in line {line_number}")
+            if fallback:
+                print(f"Line {line_number} used the fallback parse ({fallback})")
+        self.maybe_report()
+
+    def line_failed(self, line_number, message, text):
+        self.lines = line_number
+        self.errors += 1
+        print(f"Error processing line {line_number}: {message}")
+        print(f"Problematic text: {text[:200]}...")
+        self.maybe_report()
+
+    def line_quarantined(self, line_number, error):
+        self.quarantined += 1
+        # A wrong encoding quarantines every line: past the first few they
+        # only show up in the progress reports and the summary
+        if self.verbose or self.quarantined <= QUARANTINE_PRINTED_LINES:
+            print(f"Quarantined line {line_number}: {error}")
+        elif self.quarantined == QUARANTINE_PRINTED_LINES + 1:
+            print("More lines don't decode, only counting them from here on")
+        self.maybe_report()
+
+    def maybe_report(self):
+        now = time.perf_counter()
+        if now - self.last_report >= self.interval:
+            self.last_report = now
+            self.report(now)
+
+    def report(self, now=None):
+        elapsed = (now or time.perf_counter()) - self.start_time
+        if elapsed <= 0:
+            return
+        progress = f"Line {self.lines}: {self.lines / elapsed:.0f} lines/s, {self.products / elapsed:.0f} products/s"
+        if self.quarantined:
+            progress += f", {self.quarantined} quarantined"
+        if self.total_bytes and self.bytes_read:
+            remaining = elapsed * (self.total_bytes - self.bytes_read) / self.bytes_read
+            progress += f", {100 * self.bytes_read / self.total_bytes:.1f}% read, ETA {remaining:.0f}s"
+        print(progress)
+
+    def summary(self):
+        """
+        End-of-run statistics as a JSON-serializable dict
+        """
+        elapsed = time.perf_counter() - self.start_time
+        return {
+            "lines": self.lines,
+            "parsed_lines": self.parsed_lines,
+            "products": self.products,
+            "errors": self.errors,
+            "encoding": self.encoding,
+            "quarantined": self.quarantined,
+            "fallbacks": dict(self.fallbacks),
+            "elapsed_seconds": round(elapsed, 3),
+            "lines_per_second": round(self.lines / elapsed, 1) if elapsed else None,
+            "products_per_row": {str(k): v for k, v in sorted(self.products_per_row.items())},
+            "cache": self.cache.stats() if self.cache else None,
+            "slowest_rows": [
+                {"line": line_number, "seconds": round(seconds, 6), "text": text}
+                for seconds, line_number, text in sorted(self.slowest, reverse=True)
+            ]
+        }
+
+    def print_summary(self, stats_file=None):
+        summary = self.summary()
+        print(f"\nProcessed {summary['lines']} lines in {summary['elapsed_seconds']}s "
+              f"({summary['lines_per_second']} lines/s), {summary['errors']} errors.")
+        if self.quarantined:
+            print(f"Quarantined {self.quarantined} undecodable lines ({self.encoding}).")
+        if self.fallbacks:
+            print("Fallback parses: " + ", ".join(f"{k}: {v}" for k, v in self.fallbacks.items()))
+        if summary['cache']:
+            cache = summary['cache']
+            print(f"Cache: {cache['hits']} hits, {cache['disk_hits']} from disk, "
+                  f"{cache['misses']} misses, {cache['evictions']} evictions")
+        print("Products per row: " + ", ".join(f"{k}: {v}" for k, v in summary['products_per_row'].items()))
+        print("Slowest rows:")
+        for row in summary['slowest_rows']:
+            print(f"  line {row['line']} ({row['seconds']}s): {row['text']}...")
+        if stats_file:
+            with open(stats_file, 'w', encoding='utf-8') as f:
+                json.dump(summary, f, ensure_ascii=False, indent=2)
+            print(f"Stats saved to '{stats_file}'.")
+
+
+# Bytes from the start of the input that its encoding is detected from,
+# so detection costs the same however large the file is
+ENCODING_SAMPLE_BYTES = 64 * 1024
+
+# Encoding assumed when neither a BOM, UTF-8 nor chardet tells otherwise
+FALLBACK_ENCODING = 'cp1251'
+
+# Block size of reads when lines have to be split by hand
+READ_BLOCK_BYTES = 1024 * 1024
+
+# Appended to the output file name for the file undecodable lines go to
+QUARANTINE_SUFFIX = '.quarantine'
+
+# Undecodable lines reported one by one before they are only counted
+QUARANTINE_PRINTED_LINES = 5
+
+# Byte order marks and their encodings. UTF-32 comes first because the
+# UTF-32 LE mark starts with the UTF-16 LE one.
+BOMS = [
+    (codecs.BOM_UTF32_LE, 'utf-32-le'),
+    (codecs.BOM_UTF32_BE, 'utf-32-be'),
+    (codecs.BOM_UTF8, 'utf-8'),
+    (codecs.BOM_UTF16_LE, 'utf-16-le'),
+    (codecs.BOM_UTF16_BE, 'utf-16-be')
+]
+
+
+# Codecs that read and write a byte order mark, and their family. Lines
+# are decoded one by one, so the endian-specific codec is used instead.
+BOM_CODECS = {'utf-8-sig': 'utf-8', 'utf-16': 'utf-16', 'utf-32': 'utf-32'}
+
+
+def line_encoding(encoding, detected):
+    """
+    The codec to decode single lines with when encoding was asked for and
+    detected was found: a BOM-carrying codec is swapped for the codec
+    without a BOM, of the byte order detected, little-endian by default
+    """
+    name = codecs.lookup(encoding).name
+    family = BOM_CODECS.get(name)
+    if family is None:
+        return name
+    if detected == family or detected.startswith(family + '-'):
+        return detected
+    return family if family == 'utf-8' else family + '-le'
+
+
+def detect_encoding(sample):
+    """
+    Guess the encoding of a file from a sample of its first bytes, returning
+    the encoding and the length of its byte order mark.
+    A BOM decides, then NUL bytes on every other byte mean UTF-16, then UTF-8
+    if most sample lines with non-ASCII bytes decode as UTF-8 (so a few
+    broken lines end up quarantined rather than deciding the encoding).
+    Only the rest goes to chardet, which is fed the sample until it is sure.
+    """
+    for bom, encoding in BOMS:
+        if sample.startswith(bom):
+            return encoding, len(bom)
+
+    even_nuls, odd_nuls = sample[0::2].count(0), sample[1::2].count(0)
+    if max(even_nuls, odd_nuls) > len(sample) // 8:
+        return ('utf-16-le' if odd_nuls > even_nuls else 'utf-16-be'), 0
+
+    valid = invalid = 0
+    for line in sample.split(b'\n'):
+        if line.isascii():
+            continue
+        try:
+            # Not final: the sample can end in the middle of a character
+            codecs.utf_8_decode(line, 'strict', False)
+            valid += 1
+        except UnicodeDecodeError:
+            invalid += 1
+    if valid > invalid or not invalid:
+        return 'utf-8', 0
+
+    detector = chardet.UniversalDetector()
+    for start in range(0, len(sample), 4096):
+        detector.feed(sample[start:start + 4096])
+        if detector.done:
+            break
+    detector.close()
+    try:
+        return codecs.lookup(detector.result['encoding']).name, 0
+    except (LookupError, TypeError):
+        return FALLBACK_ENCODING, 0
+
+
+def split_lines(file, newline):
+    """
+    Yield the lines of a binary file, newline included, for encodings whose
+    newline is more than one byte. Only newlines that start on a character
+    boundary count: in UTF-16 the newline bytes also occur inside other
+    characters.
+    """
+    unit = len(newline)
+    buffer = b''
+    while block := file.read(READ_BLOCK_BYTES):
+        buffer += block
+        start = search = 0
+        while (position := buffer.find(newline, search)) >= 0:
+            if (position - start) % unit:
+                search = position + 1
+                continue
+            search = position + unit
+            yield buffer[start:search]
+            start = search
+        buffer = buffer[start:]
+    if buffer:
+        yield buffer
+
+
+def read_lines(file, reporter, encoding=None, quarantine_file=None):
+    """
+    Lazily yield (line number, text) for every non-empty line of a file
+    opened in binary mode.
+    Unless given, the encoding is detected from the first
+    ENCODING_SAMPLE_BYTES of the file, which has to be seekable; utf-16
+    and the like take their byte order from the BOM. Lines are
+    decoded one at a time; a line that doesn't decode is counted, copied
+    byte for byte to quarantine_file if given, and skipped.
+    """
+    detected, bom = detect_encoding(file.read(ENCODING_SAMPLE_BYTES))
+    if encoding is None:
+        encoding = detected
+    else:
+        encoding = line_encoding(encoding, detected)
+        if encoding != detected:
+            bom = 0
+    file.seek(bom)
+    reporter.line_read(bom)
+    reporter.encoding = encoding
+    print(f"Input encoding: {encoding}")
+
+    newline = '\n'.encode(encoding)
+    lines = file if len(newline) == 1 else split_lines(file, newline)
+    quarantine = None
+    try:
+        for index, line in enumerate(lines):
+            reporter.line_read(len(line))
+
+            # Clean the line
+            try:
+                text = line.decode(encoding).strip()
+            except UnicodeDecodeError as e:
+                reporter.line_quarantined(index + 1, e)
+                if quarantine_file:
+                    if quarantine is None:
+                        quarantine = open(quarantine_file, 'wb')
+                    quarantine.write(line)
+                continue
+
+            # Skip empty lines
+            if not text:
+                if reporter.verbose:
+                    print("Skipping empty line")
+                continue
+
+            yield index + 1, text
+    finally:
+        if quarantine is not None:
+            quarantine.close()
+            print(f"Undecodable lines saved to '{quarantine_file}'.")
+
+
+def parse_lines(numbered_lines, reporter, time_budget=ROW_TIME_BUDGET, max_row_chars=MAX_ROW_CHARS,
+                cache=None):
+    """
+    Parse lines one at a time, yielding parsed products.
+    A line that fails to parse is reported and skipped.
+    """
+    for line_number, text in numbered_lines:
+        if reporter.verbose:
+            print(f"\nProcessing line {line_number}")
+            print(f"Text length: {len(text)}")
+            print(f"First 100 characters: {text[:100]}...")
+        start = time.perf_counter()
+        try:
+            parsed_products, fallback = parse_row_cached(text, cache, time_budget, max_row_chars)
+        except Exception as e:
+            reporter.line_failed(line_number, str(e), text)
+            continue
+        reporter.line_parsed(line_number, len(parsed_products), time.perf_counter() - start, text, fallback)
         
-        # Parse the line
-        print("Starting to parse...")
-        parsed_products = parse_row(text)
-        print(f"Found {len(parsed_products)} products in this line")
-        parsed_data.extend(parsed_products)
+        yield from parsed_products
+
+
+def parse_chunk(chunk, time_budget=ROW_TIME_BUDGET, max_row_chars=MAX_ROW_CHARS, vectorized=False):
+    """
+    Parse a chunk of (line number, text) pairs in a worker process.
+    Errors are caught per line, so one bad line doesn't lose the chunk.
+    Returns (products, fallback reason, seconds, error message) for every
+    line, plus the worker's profiling data for the chunk when profiling is
+    enabled.
+    """
+    if vectorized:
+        results = parse_chunk_vectorized([text for _, text in chunk], time_budget, max_row_chars)
+        profile = PROFILER.snapshot(reset=True) if PROFILER else None
+        return results, profile
+
+    results = []
+    for line_number, text in chunk:
+        start = time.perf_counter()
+        try:
+            parsed_products, fallback = parse_row_with_budget(text, time_budget, max_row_chars)
+            results.append((parsed_products, fallback, time.perf_counter() - start, None))
+        except Exception as e:
+            results.append((None, None, time.perf_counter() - start, str(e)))
+    profile = PROFILER.snapshot(reset=True) if PROFILER else None
+    return results, profile
+
+
+def collect_chunk(chunk, cached, chunk_result, reporter, cache=None):
+    """
+    Yield the products of a parsed chunk, reporting lines that failed.
+    cached holds the cache hit of every line, None for the lines that were
+    sent to the worker.
+    """
+    results, profile = chunk_result
+    if profile:
+        PROFILER.merge(profile)
+    results = iter(results)
+    for (line_number, text), hit in zip(chunk, cached):
+        if hit is not None:
+            parsed_products, fallback = hit
+            reporter.line_parsed(line_number, len(parsed_products), 0.0, text, fallback)
+            yield from parsed_products
+            continue
         
+        parsed_products, fallback, seconds, error = next(results)
+        if error:
+            reporter.line_failed(line_number, error, text)
+            continue
+        if cache is not None:
+            cache.put(text, parsed_products, fallback)
+        reporter.line_parsed(line_number, len(parsed_products), seconds, text, fallback)
+        yield from parsed_products
+
+
+def parse_lines_vectorized(numbered_lines, reporter, chunk_size=CHUNK_SIZE,
+                           time_budget=ROW_TIME_BUDGET, max_row_chars=MAX_ROW_CHARS, cache=None):
+    """
+    Parse lines chunk by chunk with the vectorized engine, yielding parsed products
+    """
+    for chunk in batched(numbered_lines, chunk_size):
+        cached = [cache.get(text) if cache is not None else None for _, text in chunk]
+        misses = [item for item, hit in zip(chunk, cached) if hit is None]
+        chunk_result = parse_chunk(misses, time_budget, max_row_chars, vectorized=True)
+        yield from collect_chunk(chunk, cached, chunk_result, reporter, cache)
+
+
+def init_worker(rules_file, profile):
+    """
+    Set a worker process up like this one: the same rule file, and profiling
+    when it is on. Worker timings are merged back into this process chunk
+    by chunk.
+    """
+    if rules_file != RULES_FILE:
+        load_rules(rules_file)
+    if profile:
+        enable_profiling()
+
+
+def parse_lines_parallel(numbered_lines, reporter, workers=None, chunk_size=CHUNK_SIZE,
+                         time_budget=ROW_TIME_BUDGET, max_row_chars=MAX_ROW_CHARS, cache=None,
+                         vectorized=False):
+    """
+    Parse lines on a pool of worker processes, yielding products in input order.
+    Only a few chunks per worker are in flight at once, so the input is still
+    read lazily. The cache lives in this process: only lines it misses are
+    sent to the workers.
+    """
+    workers = workers or os.cpu_count()
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(RULES_FILE, PROFILER is not None)) as executor:
+        pending = deque()
+        for chunk in batched(numbered_lines, chunk_size):
+            cached = [cache.get(text) if cache is not None else None for _, text in chunk]
+            misses = [item for item, hit in zip(chunk, cached) if hit is None]
+            future = executor.submit(parse_chunk, misses, time_budget, max_row_chars, vectorized)
+            pending.append((chunk, cached, future))
+            if len(pending) >= workers * 2:
+                chunk, cached, future = pending.popleft()
+                yield from collect_chunk(chunk, cached, future.result(), reporter, cache)
+        while pending:
+            chunk, cached, future = pending.popleft()
+            yield from collect_chunk(chunk, cached, future.result(), reporter, cache)
+
+
+def batched(items, batch_size):
+    """
+    Group an iterable into lists of at most batch_size items
+    """
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def quantity_array(quantities):
+    """
+    Quantities as an Int64 array, so they stay integral whether or not the
+    batch has gaps. A quantity outside the int64 range keeps the batch an
+    object column, which is written the same way.
+    """
+    try:
+        return pd.array(quantities, dtype='Int64')
+    except (TypeError, OverflowError):
+        return pd.array(quantities, dtype=object)
+
+
+class ProductColumns:
+    """
+    Columnar accumulator for parsed products. Every field of a product is
+    appended to its own column as the products stream in, so a batch is
+    never held as a list of dicts. CATEGORICAL_COLUMNS are dictionary-encoded:
+    each distinct value is stored once and rows only hold an array('i') code,
+    -1 for None.
+    """
+    __slots__ = ('columns', 'codes', 'categories', 'length', 'appenders', 'encoders')
+
+    def __init__(self):
+        self.columns = {name: [] for name in OUTPUT_COLUMNS if name not in CATEGORICAL_COLUMNS}
+        # Bound append methods, looked up once instead of per product
+        self.appenders = [(name, column.append) for name, column in self.columns.items()]
+        self.reset_codes()
+
+    def reset_codes(self):
+        # Every batch is written as its own frame, so the value -> code
+        # dictionaries start over with it and only hold the batch's values
+        self.categories = {name: {} for name in CATEGORICAL_COLUMNS}
+        self.codes = {name: array('i') for name in CATEGORICAL_COLUMNS}
+        self.encoders = [(name, self.categories[name], codes.append) for name, codes in self.codes.items()]
+        self.length = 0
+
+    def __len__(self):
+        return self.length
+
+    def append(self, product):
+        get = product.get
+        for name, append in self.appenders:
+            append(get(name))
+        for name, categories, append in self.encoders:
+            value = get(name)
+            if value is None:
+                append(-1)
+                continue
+            code = categories.get(value)
+            if code is None:
+                code = categories[value] = len(categories)
+            append(code)
+        self.length += 1
+
+    def to_frame(self):
+        """
+        The accumulated products as a DataFrame, categorical columns as
+        pandas categoricals built straight from the codes
+        """
+        data = {}
+        for name in OUTPUT_COLUMNS:
+            if name in self.codes:
+                data[name] = pd.Categorical.from_codes(self.codes[name], list(self.categories[name]))
+            elif name == 'Quantity':
+                data[name] = quantity_array(self.columns[name])
+            else:
+                data[name] = self.columns[name]
+        return pd.DataFrame(data, columns=OUTPUT_COLUMNS)
+
+    def clear(self):
+        for column in self.columns.values():
+            column.clear()
+        # New codes and dictionaries: the last frame may still hold views of the old ones
+        self.reset_codes()
+
+
+def write_csv_batches(products, output_file, batch_size=BATCH_SIZE):
+    """
+    Write products to a CSV file batch by batch, so only one batch is held
+    in memory at a time, in a ProductColumns accumulator.
+    Returns the number of products written.
+    """
+    total_products = 0
+    # Start a fresh file with the header, then append every batch
+    pd.DataFrame(columns=OUTPUT_COLUMNS).to_csv(output_file, index=False, encoding='utf-8')
+    accumulator = ProductColumns()
+    for product in products:
+        accumulator.append(product)
+        if len(accumulator) >= batch_size:
+            total_products += write_csv_batch(accumulator, output_file)
+    if len(accumulator):
+        total_products += write_csv_batch(accumulator, output_file)
+    return total_products
+
+
+def write_csv_batch(accumulator, output_file):
+    """
+    Append the products of an accumulator to the CSV file and empty it
+    """
+    written = len(accumulator)
+    accumulator.to_frame().to_csv(output_file, mode='a', header=False, index=False, encoding='utf-8')
+    accumulator.clear()
+    return written
+
+
+def run(input_file=INPUT_FILE, output_file=OUTPUT_FILE, batch_size=BATCH_SIZE,
+        workers=1, chunk_size=CHUNK_SIZE, verbose=False,
+        progress_interval=PROGRESS_INTERVAL, stats_file=None, profile_file=None,
+        time_budget=ROW_TIME_BUDGET, max_row_chars=None,
+        cache_size=CACHE_SIZE, cache_db=None, engine='row', rules_file=None,
+        encoding=None, quarantine_file=None):
+    """
+    Stream input_file through the parser into output_file.
+    With workers other than 1, lines are parsed on a process pool
+    (workers=None uses every core). Progress is reported at most once per
+    progress_interval seconds; verbose prints every line as it is parsed.
+    If profile_file is given, per-stage and per-pattern timings are written
+    to it as JSON. Rows over max_row_chars or time_budget seconds get the
+    cheap fallback parse and are flagged in the Fallback_Reason column;
+    max_row_chars defaults to the longest row that fits the time budget.
+    Repeated rows are served from an LRU cache of cache_size rows (0 turns
+    it off), persisted to the SQLite file cache_db if given.
+    engine='vectorized' runs the simple extractors column-wise over each
+    chunk of lines instead of row by row, and rules out product patterns
+    with Arrow's RE2 engine when pyarrow is installed. rules_file replaces
+    the default parsing_rules.json. The input encoding is detected unless given; lines
+    that don't decode are skipped and saved to quarantine_file (by default
+    the output file name plus QUARANTINE_SUFFIX).
+    """
+    if max_row_chars is None:
+        max_row_chars = row_chars_for_budget(time_budget) if time_budget else MAX_ROW_CHARS
+
+    print("Starting to read file...")
+    try:
+        file = open(input_file, 'rb')
+        total_bytes = os.path.getsize(input_file)
     except Exception as e:
-        print(f"Error processing line {index + 1}: {str(e)}")
-        print(f"Problematic text: {text[:200]}...")
-        continue
+        print(f"Error reading file: {e}")
+        print("Current working directory:", os.getcwd())
+        exit()
+    
+    # Rules go first: profiling wraps the compiled patterns,
+    # and the cache fingerprint covers the rule file
+    if rules_file:
+        load_rules(rules_file)
+    if profile_file:
+        enable_profiling()
+    
+    reporter = ProgressReporter(total_bytes, progress_interval, verbose)
+    cache = ParseCache(cache_size, cache_db) if cache_size else None
+    reporter.cache = cache
+    print(f"\nStarting to process {input_file}...")
+    with file:
+        vectorized = engine == 'vectorized'
+        lines = read_lines(file, reporter, encoding, quarantine_file or output_file + QUARANTINE_SUFFIX)
+        if workers != 1:
+            products = parse_lines_parallel(lines, reporter, workers, chunk_size,
+                                            time_budget, max_row_chars, cache, vectorized)
+        elif vectorized:
+            products = parse_lines_vectorized(lines, reporter, chunk_size,
+                                              time_budget, max_row_chars, cache)
+        else:
+            products = parse_lines(lines, reporter, time_budget, max_row_chars, cache)
+        try:
+            total_products = write_csv_batches(products, output_file, batch_size)
+        finally:
+            if cache is not None:
+                cache.close()
+    
+    print("\nAll lines processed")
+    reporter.print_summary(stats_file)
+    if profile_file:
+        PROFILER.dump(profile_file)
+        print(f"Profile saved to '{profile_file}'.")
+    print(f"\nParsing completed. Processed {reporter.lines} lines.")
+    print(f"Generated {total_products} product entries.")
+    print(f"Output saved to '{output_file}'.")
+    print("\nFirst few rows of the output:")
+    print(pd.read_csv(output_file, nrows=5))
 
-print("\nAll lines processed")
 
-# Convert to DataFrame for structured output
-print("Converting to DataFrame...")
-df = pd.DataFrame(parsed_data)
+if __name__ == "__main__":
+    import argparse
 
-# Save to CSV
-output_file = "D:/parsed_products.csv"
-print(f"Saving to {output_file}...")
-df.to_csv(output_file, index=False, encoding='utf-8')
+    arg_parser = argparse.ArgumentParser(description="Parse customs product descriptions into structured CSV")
+    arg_parser.add_argument('input_file', nargs='?', default=INPUT_FILE)
+    arg_parser.add_argument('output_file', nargs='?', default=OUTPUT_FILE)
+    arg_parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help="products written to the output per batch")
+    arg_parser.add_argument('--workers', type=int, default=1,
+                            help="worker processes to parse with (0 = all cores)")
+    arg_parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                            help="input lines per chunk handed to a worker")
+    arg_parser.add_argument('-v', '--verbose', action='store_true',
+                            help="print every line as it is parsed")
+    arg_parser.add_argument('--progress-interval', type=float, default=PROGRESS_INTERVAL,
+                            help="seconds between progress reports")
+    arg_parser.add_argument('--stats-file',
+                            help="write end-of-run statistics to this JSON file")
+    arg_parser.add_argument('--profile',
+                            help="time every parser stage and pattern, writing the totals to this JSON file")
+    arg_parser.add_argument('--time-budget', type=float, default=ROW_TIME_BUDGET,
+                            help="seconds a row may take before it gets the fallback parse (0 = no limit)")
+    arg_parser.add_argument('--max-row-chars', type=int,
+                            help="longer rows get the fallback parse straight away "
+                                 "(default: what fits in --time-budget, 0 = no limit)")
+    arg_parser.add_argument('--cache-size', type=int, default=CACHE_SIZE,
+                            help="distinct rows kept in the in-memory parse cache (0 = no cache)")
+    arg_parser.add_argument('--cache-db',
+                            help="SQLite file the parse cache is persisted to between runs")
+    arg_parser.add_argument('--engine', choices=['row', 'vectorized'], default='row',
+                            help="parse row by row, or run the simple extractors column-wise per chunk")
+    arg_parser.add_argument('--rules',
+                            help="JSON rule file to parse with instead of parsing_rules.json")
+    arg_parser.add_argument('--encoding',
+                            help="input encoding (default: detected from the start of the file)")
+    arg_parser.add_argument('--quarantine-file',
+                            help="where undecodable input lines are saved "
+                                 f"(default: the output file name plus '{QUARANTINE_SUFFIX}')")
+    args = arg_parser.parse_args()
 
-print(f"\nParsing completed. Processed {total_lines} lines.")
-print(f"Generated {len(parsed_data)} product entries.")
-print(f"Output saved to '{output_file}'.")
-print("\nFirst few rows of the output:")
-print(df.head())
\ No newline at end of file
+    run(args.input_file, args.output_file, args.batch_size,
+        args.workers or None, args.chunk_size, args.verbose,
+        args.progress_interval, args.stats_file, args.profile,
+        args.time_budget, args.max_row_chars, args.cache_size, args.cache_db, args.engine,
+        args.rules, args.encoding, args.quarantine_file)